@@ -3,19 +3,37 @@
 
 import json
 import logging
+import queue
 import ssl
 import os
+import threading
+import time
 from typing import Callable, Dict, Optional
 
 from dotenv import load_dotenv  # NEW: For loading secrets
 import paho.mqtt.client as mqtt
 
+from config_loader import read_config_file
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Parsing the system trust store is slow on a Pi, so build the TLS context once per process
+_SHARED_TLS_CTX: Optional[ssl.SSLContext] = None
+
+
+def _shared_tls_context() -> ssl.SSLContext:
+    global _SHARED_TLS_CTX
+    if _SHARED_TLS_CTX is None:
+        _SHARED_TLS_CTX = ssl.create_default_context()
+    return _SHARED_TLS_CTX
+
 
 class MQTT_communicator:
+    # Payloads that switch a device on, compared against the raw (stripped, upper-cased) bytes
+    _TRUTHY = frozenset((b"ON", b"1", b"TRUE", b"HIGH"))
+
     def __init__(
         self,
         config_file: str = 'config.json',
@@ -23,12 +41,27 @@ class MQTT_communicator:
         on_set_mode: Optional[Callable[[str], None]] = None,
     ):
         self.config = self.load_config(config_file)
+        self.device_id = self.config.get("DEVICE_ID", "pi_01")
         self.mqtt_client = None
         self.mqtt_connected = False
         self._on_set_device_state = on_set_device_state
         self._on_set_mode = on_set_mode
         self.control_feeds: Dict[str, str] = self.config.get("CONTROL_FEEDS", {})
         self._feed_to_device = {feed: device for device, feed in self.control_feeds.items()}
+        self._topic_cache: Dict[str, str] = {}  # feed name -> full MQTT topic
+        # Dedup state, keyed by feed name (or "groups/<key>"). Repeats are checked against what was
+        # last queued, so a value that differs from one still waiting in the queue always goes out;
+        # _last_sent (accepted by the broker) is what a failed publish rolls _last_queued back to.
+        self._last_queued: Dict[str, str] = {}
+        self._last_sent: Dict[str, str] = {}
+        self._dedup_lock = threading.Lock()
+        # Outgoing publishes are handed to a worker so callers never block on the socket
+        self._pub_q: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=1000)
+        self._pub_thread: Optional[threading.Thread] = None
+        self._running = False
+        # Token bucket keeping the worker under Adafruit IO's data rate limit
+        self._publish_rate = float(self.config.get("publish_rate_per_s", 2.0))
+        self._publish_burst = float(self.config.get("publish_burst", 5))
         self.setup_mqtt()
 
     def load_config(self, config_file):
@@ -43,10 +76,9 @@ class MQTT_communicator:
         }
 
         try:
-            with open(config_file, 'r') as f:
-                json_config = json.load(f)
+            json_config = read_config_file(config_file)
         except FileNotFoundError:
-            logger.warning(f"Config file {config_file} not found, using defaults")
+            logger.warning("Config file %s not found, using defaults", config_file)
             json_config = {}
 
         # Merge Defaults + JSON
@@ -67,7 +99,14 @@ class MQTT_communicator:
             return
 
         try:
-            self.mqtt_client = mqtt.Client()
+            self.mqtt_client = mqtt.Client(
+                callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+                client_id=f"jeefhs-{self.device_id}",
+                clean_session=True,
+                reconnect_on_failure=True,
+            )
+            self.mqtt_client.max_inflight_messages_set(20)
+            self.mqtt_client.reconnect_delay_set(min_delay=1, max_delay=8)
 
             # Username / password (Adafruit IO requires both)
             self.mqtt_client.username_pw_set(
@@ -84,7 +123,7 @@ class MQTT_communicator:
             # TLS (optional)
             use_tls = bool(self.config.get("use_tls", False))
             if use_tls:
-                self.mqtt_client.tls_set(context=ssl.create_default_context())
+                self.mqtt_client.tls_set(context=_shared_tls_context())
                 port = int(self.config.get("MQTT_PORT", 8883))
             else:
                 port = int(self.config.get("MQTT_PORT", 1883))
@@ -98,45 +137,54 @@ class MQTT_communicator:
 
             # Start the network loop in a separate thread
             self.mqtt_client.loop_start()
-            logger.info(f"MQTT client setup completed (TLS={'on' if use_tls else 'off'})")
+
+            self._running = True
+            self._pub_thread = threading.Thread(target=self._pub_worker, name="MQTTPublisher", daemon=True)
+            self._pub_thread.start()
+            logger.info("MQTT client setup completed (TLS=%s)", "on" if use_tls else "off")
 
         except Exception as e:
-            logger.error(f"Failed to setup MQTT client: {e}")
+            logger.error("Failed to setup MQTT client: %s", e)
             self.mqtt_connected = False
 
-    def on_mqtt_connect(self, client, userdata, flags, rc):
-        if rc == 0:
+    def on_mqtt_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code == 0:
             self.mqtt_connected = True
+            # Anything published before this session may not have reached the feed; resend it
+            self._reset_dedup()
             logger.info("Connected to MQTT broker")
             self._subscribe_control_feeds()
         else:
             self.mqtt_connected = False
-            logger.error(f"Failed to connect to MQTT broker, return code {rc}")
+            logger.error("Failed to connect to MQTT broker, return code %s", reason_code)
 
-    def on_mqtt_disconnect(self, client, userdata, rc):
+    def on_mqtt_disconnect(self, client, userdata, flags, reason_code, properties):
         self.mqtt_connected = False
-        if rc != 0:
-            logger.warning(f"Unexpected disconnection from MQTT broker (rc={rc})")
+        self._reset_dedup()
+        if reason_code != 0:
+            logger.warning("Unexpected disconnection from MQTT broker (rc=%s)", reason_code)
         else:
             logger.info("Disconnected from MQTT broker")
 
-    def on_mqtt_publish(self, client, userdata, mid):
-        logger.debug(f"Message {mid} published successfully")
+    def on_mqtt_publish(self, client, userdata, mid, reason_code, properties):
+        logger.debug("Message %s published successfully", mid)
 
     def on_mqtt_message(self, client, userdata, message):
-        try:
-            payload = message.payload.decode("utf-8").strip()
-        except UnicodeDecodeError:
-            logger.warning("Dropping non-text MQTT payload from %s", message.topic)
-            return
-
-        feed_key = message.topic.split("/")[-1]
+        feed_key = message.topic.rpartition("/")[2]
         device_or_mode = self._feed_to_device.get(feed_key)
         if device_or_mode is None:
             logger.debug("Ignoring MQTT message for untracked feed %s", feed_key)
             return
 
+        raw = message.payload.strip().upper()
+
         if device_or_mode == "mode":
+            # Only the mode handler needs a str; device toggles compare raw bytes
+            try:
+                payload = raw.decode("utf-8")
+            except UnicodeDecodeError:
+                logger.warning("Dropping non-text MQTT payload from %s", message.topic)
+                return
             if self._on_set_mode:
                 try:
                     self._on_set_mode(payload)
@@ -144,7 +192,7 @@ class MQTT_communicator:
                     logger.warning("Mode control handler failed: %s", exc)
             return
 
-        desired_state = payload.upper() in {"ON", "1", "TRUE", "HIGH"}
+        desired_state = raw in self._TRUTHY
         if self._on_set_device_state:
             try:
                 self._on_set_device_state(device_or_mode, desired_state)
@@ -152,25 +200,104 @@ class MQTT_communicator:
                 logger.exception("Device control handler failed for %s: %s", device_or_mode, exc)
 
     def send_to_adafruit_io(self, feed_name, value):
+        """Queue a value for publishing; returns False if it could not be queued."""
         if not self.mqtt_client or not self.mqtt_connected:
             logger.warning("MQTT client not connected")
             return False
 
-        try:
-            topic = f"{self.config['ADAFRUIT_IO_USERNAME']}/feeds/{feed_name}"
-            result, mid = self.mqtt_client.publish(topic, str(value))
-            if result == mqtt.MQTT_ERR_SUCCESS:
-                logger.info(f"Published {value} to {topic}")
+        svalue = format(value, ".3f") if isinstance(value, float) else str(value)
+        topic = self._topic_for(feed_name)
+        return self._enqueue(feed_name, topic, svalue)
+
+    def send_group_to_adafruit_io(self, group_key, values):
+        """Queue several feed values as one Adafruit IO group publish."""
+        if not self.mqtt_client or not self.mqtt_connected:
+            logger.warning("MQTT client not connected")
+            return False
+        if not values:
+            return True
+
+        feeds = {
+            feed: format(value, ".3f") if isinstance(value, float) else str(value)
+            for feed, value in values.items()
+        }
+        cache_key = f"groups/{group_key}"
+        payload = json.dumps({"feeds": feeds}, separators=(",", ":"))
+        topic = self._topic_cache.get(cache_key)
+        if topic is None:
+            topic = self._topic_cache.setdefault(
+                cache_key, f"{self.config['ADAFRUIT_IO_USERNAME']}/groups/{group_key}"
+            )
+        return self._enqueue(cache_key, topic, payload)
+
+    def _enqueue(self, dedup_key, topic, payload):
+        with self._dedup_lock:
+            if self._last_queued.get(dedup_key) == payload:
+                # Unchanged: the feed already holds (or is about to get) this value
                 return True
-            else:
-                logger.error(f"Failed to publish {value} to {topic}, result={result}")
+            try:
+                self._pub_q.put_nowait((topic, payload, 0, False, dedup_key))
+            except queue.Full:
+                logger.warning("Publish queue full; dropping %s for %s", payload, topic)
                 return False
+            self._last_queued[dedup_key] = payload
+            return True
 
-        except Exception as e:
-            logger.error(f"Error publishing to MQTT: {e}")
-            return False
+    def _publish_done(self, dedup_key, payload, ok):
+        with self._dedup_lock:
+            if ok:
+                self._last_sent[dedup_key] = payload
+            elif self._last_queued.get(dedup_key) == payload:
+                # Nothing newer is queued, so the feed still holds the last accepted value
+                previous = self._last_sent.get(dedup_key)
+                if previous is None:
+                    self._last_queued.pop(dedup_key, None)
+                else:
+                    self._last_queued[dedup_key] = previous
+
+    def _reset_dedup(self):
+        with self._dedup_lock:
+            self._last_queued.clear()
+            self._last_sent.clear()
+
+    def _pub_worker(self):
+        rate, burst = self._publish_rate, self._publish_burst
+        tokens, last = burst, time.monotonic()
+        while self._running:
+            item = self._pub_q.get()
+            if item is None:
+                break
+            if rate > 0:
+                now = time.monotonic()
+                tokens = min(burst, tokens + (now - last) * rate)
+                last = now
+                if tokens < 1:
+                    # Out of budget: hold this publish until the next token is due
+                    time.sleep((1 - tokens) / rate)
+                    tokens, last = 1.0, time.monotonic()
+                tokens -= 1
+            topic, payload, qos, retain, dedup_key = item
+            ok = False
+            try:
+                result, mid = self.mqtt_client.publish(topic, payload, qos=qos, retain=retain)
+                ok = result == mqtt.MQTT_ERR_SUCCESS
+                if ok:
+                    if logger.isEnabledFor(logging.INFO):
+                        logger.info("Published %s to %s", payload, topic)
+                else:
+                    logger.error("Failed to publish %s to %s, result=%s", payload, topic, result)
+            except (OSError, ValueError) as e:
+                logger.error("Error publishing to MQTT: %s", e)
+            self._publish_done(dedup_key, payload, ok)
 
     def close(self):
+        self._running = False
+        if self._pub_thread is not None:
+            try:
+                self._pub_q.put_nowait(None)
+            except queue.Full:
+                pass
+            self._pub_thread.join(timeout=2)
         try:
             if self.mqtt_client is not None:
                 self.mqtt_client.loop_stop()
@@ -178,14 +305,21 @@ class MQTT_communicator:
         except Exception:
             pass
 
+    def _topic_for(self, feed_name: str) -> str:
+        topic = self._topic_cache.get(feed_name)
+        if topic is None:
+            topic = self._topic_cache.setdefault(
+                feed_name, f"{self.config['ADAFRUIT_IO_USERNAME']}/feeds/{feed_name}"
+            )
+        return topic
+
     def _subscribe_control_feeds(self) -> None:
         if not self.mqtt_client or not self.control_feeds:
             return
-        username = self.config["ADAFRUIT_IO_USERNAME"]
-        for device, feed in self.control_feeds.items():
-            topic = f"{username}/feeds/{feed}"
-            result, _ = self.mqtt_client.subscribe(topic)
-            if result == mqtt.MQTT_ERR_SUCCESS:
-                logger.info("Subscribed to control feed %s (%s)", feed, device)
-            else:
-                logger.warning("Failed to subscribe to %s (code %s)", topic, result)
\ No newline at end of file
+        # One SUBSCRIBE packet carrying every control feed filter
+        topics = [(self._topic_for(feed), 0) for feed in self.control_feeds.values()]
+        result, _ = self.mqtt_client.subscribe(topics)
+        if result == mqtt.MQTT_ERR_SUCCESS:
+            logger.info("Subscribed to %d control feeds (%s)", len(topics), ", ".join(self.control_feeds))
+        else:
+            logger.warning("Failed to subscribe to control feeds (code %s)", result)
\ No newline at end of file
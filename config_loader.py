@@ -0,0 +1,33 @@
+"""Shared, mtime-aware loading of config.json for every JeefHS module."""
+
+from __future__ import annotations
+
+import copy
+import functools
+import json
+import os
+from typing import Any, Dict
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # stdlib fallback when orjson isn't installed
+    _loads = json.loads
+
+
+@functools.lru_cache(maxsize=8)
+def _load_config_cached(path: str, mtime_ns: int) -> Dict[str, Any]:
+    with open(path, "rb") as handle:
+        return _loads(handle.read())
+
+
+def read_config_file(config_file: str) -> Dict[str, Any]:
+    """Return a private copy of the parsed config, parsing each (path, mtime) once.
+
+    Raises FileNotFoundError if the file is missing and a json.JSONDecodeError
+    subclass if it is not valid JSON. The result is deep-copied from the cached
+    parse, so callers may modify it (nested PINS/feeds dicts included) without
+    affecting other modules.
+    """
+    path = os.path.abspath(config_file)
+    return copy.deepcopy(_load_config_cached(path, os.stat(path).st_mtime_ns))
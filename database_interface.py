@@ -3,9 +3,9 @@ Database Interface for JeefHS.
 Handles local SQLite storage and background synchronization to Neon (Postgres).
 """
 
+import collections
 import sqlite3
 import threading
-import time
 import os
 import logging
 from typing import Dict
@@ -15,6 +15,7 @@ from dotenv import load_dotenv
 try:
     import psycopg2
     from psycopg2 import sql
+    from psycopg2.extras import execute_batch
 except ImportError:
     psycopg2 = None
 
@@ -45,6 +46,39 @@ CREATE TABLE IF NOT EXISTS security_events (
 );
 """
 
+# Partial indexes: the sync poll only ever visits rows that are still unsynced
+CREATE_ENV_UNSYNCED_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_meas_unsynced ON measurements(id) WHERE synced=0;
+"""
+
+CREATE_SEC_UNSYNCED_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_sec_unsynced ON security_events(id) WHERE synced=0;
+"""
+
+# Buffered rows that wake the sync thread early instead of waiting out the interval
+BATCH_THRESHOLD = 50
+# Cap on rows held in memory while SQLite writes keep failing; the oldest are dropped first
+MAX_BUFFERED_ROWS = 10_000
+
+# --- Local SQLite statements (constant text keeps sqlite's statement cache warm) ---
+_INSERT_ENV_SQL = "INSERT INTO measurements (timestamp, temperature, humidity, synced) VALUES (?, ?, ?, 0)"
+_INSERT_SEC_SQL = "INSERT INTO security_events (timestamp, event_type, image_path, mode, synced) VALUES (?, ?, ?, ?, 0)"
+_SELECT_UNSYNCED_ENV_SQL = "SELECT id, timestamp, temperature, humidity FROM measurements WHERE synced=0 LIMIT 50"
+_SELECT_UNSYNCED_SEC_SQL = "SELECT id, timestamp, event_type, image_path, mode FROM security_events WHERE synced=0 LIMIT 50"
+_UPDATE_MEAS_SYNCED_SQL = "UPDATE measurements SET synced=1 WHERE id=?"
+_UPDATE_SEC_SYNCED_SQL = "UPDATE security_events SET synced=1 WHERE id=?"
+
+# --- Cloud statements, prepared once per Postgres connection ---
+_PG_PREPARE_STATEMENTS = (
+    "PREPARE ins_meas AS INSERT INTO measurements (timestamp, temperature, humidity, device_id) "
+    "VALUES ($1, $2, $3, $4)",
+    "PREPARE ins_sec AS INSERT INTO security_events (timestamp, event_type, image_path, mode, device_id) "
+    "VALUES ($1, $2, $3, $4, $5)",
+)
+_PG_EXEC_MEAS_SQL = "EXECUTE ins_meas (%s, %s, %s, %s)"
+_PG_EXEC_SEC_SQL = "EXECUTE ins_sec (%s, %s, %s, %s, %s)"
+
+
 class DatabaseInterface:
     def __init__(self, config: Dict):
         self.config = config
@@ -56,152 +90,261 @@ class DatabaseInterface:
             self.pg_conn_str = self.pg_conn_str.replace("postgres://", "postgresql://", 1)
             
         self.device_id = "pi_01"  # Identifier for this device in the cloud
+        self._pg_conn = None  # Long-lived Neon connection, reused across sync cycles
 
+        # Single SQLite connection shared by the logger and the sync thread
+        self._sqlite = None
+        self._reported_no_sqlite = False
+        self._db_lock = threading.Lock()
         self._init_local_db()
 
+        # Pending rows waiting to be written to SQLite in one transaction
+        self._env_buf = collections.deque(maxlen=MAX_BUFFERED_ROWS)
+        self._sec_buf = collections.deque(maxlen=MAX_BUFFERED_ROWS)
+        self._buf_lock = threading.Lock()
+
+        self.sync_interval = float(self.config.get("sync_interval", 10))
+        self._wake = threading.Event()
+
         if not self.pg_conn_str:
             logger.warning("DATABASE_URL not found in .env. Cloud sync will be disabled.")
         elif psycopg2 is None:
             logger.warning("psycopg2 library not found. Cloud sync will be disabled.")
 
-        # Start background sync thread
+        # Start background sync thread (only when there is a cloud to sync to)
         self.running = True
-        self.sync_thread = threading.Thread(target=self._sync_loop, name="DBSyncWorker", daemon=True)
-        self.sync_thread.start()
+        self.sync_thread = None
+        if self.pg_conn_str and psycopg2 is not None:
+            self.sync_thread = threading.Thread(target=self._sync_loop, name="DBSyncWorker", daemon=True)
+            self.sync_thread.start()
 
     def _init_local_db(self):
-        """Initialize SQLite tables."""
+        """Open the shared SQLite connection (WAL mode) and create tables."""
         try:
-            with sqlite3.connect(self.local_db) as conn:
-                cursor = conn.cursor()
-                cursor.execute(CREATE_ENV_TABLE)
-                cursor.execute(CREATE_SEC_TABLE)
-                conn.commit()
-            logger.info(f"Local database '{self.local_db}' initialized.")
-        except Exception as e:
-            logger.error(f"Failed to initialize local DB: {e}")
+            self._sqlite = sqlite3.connect(self.local_db, check_same_thread=False, isolation_level=None)
+            if self.local_db != ":memory:":
+                # WAL lets the sync thread read while the logger writes; NORMAL avoids an fsync per commit
+                mode = self._sqlite.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+                if mode.lower() != "wal":
+                    logger.warning("SQLite refused WAL mode for '%s' (journal_mode=%s)", self.local_db, mode)
+            self._sqlite.execute("PRAGMA synchronous=NORMAL")
+            self._sqlite.execute("PRAGMA temp_store=MEMORY")
+            # Wait out a competing writer (e.g. a sqlite3 shell) instead of failing with "database is locked"
+            self._sqlite.execute("PRAGMA busy_timeout=5000")
+            # Keep the WAL bounded while offline and memory-map reads on the Pi
+            self._sqlite.execute("PRAGMA wal_autocheckpoint=1000")
+            self._sqlite.execute("PRAGMA mmap_size=67108864")
+            self._sqlite.execute(CREATE_ENV_TABLE)
+            self._sqlite.execute(CREATE_SEC_TABLE)
+            self._sqlite.execute(CREATE_ENV_UNSYNCED_INDEX)
+            self._sqlite.execute(CREATE_SEC_UNSYNCED_INDEX)
+            logger.info("Local database '%s' initialized.", self.local_db)
+        except sqlite3.Error as e:
+            logger.error("Failed to initialize local DB: %s", e)
 
     def log_environment(self, data: Dict):
-        """Log environmental data to local DB."""
-        try:
-            # Safely handle missing keys
-            ts = data.get('timestamp')
-            temp = data.get('temperature')
-            hum = data.get('humidity')
-
-            with sqlite3.connect(self.local_db) as conn:
-                conn.execute(
-                    "INSERT INTO measurements (timestamp, temperature, humidity, synced) VALUES (?, ?, ?, 0)",
-                    (ts, temp, hum)
-                )
-            logger.debug("Logged environmental data locally.")
-        except Exception as e:
-            logger.error(f"Failed to log env data locally: {e}")
+        """Queue environmental data for the next local DB flush."""
+        # Safely handle missing keys
+        row = (data.get('timestamp'), data.get('temperature'), data.get('humidity'))
+        with self._buf_lock:
+            self._env_buf.append(row)
+            pending = len(self._env_buf)
+        if pending >= BATCH_THRESHOLD:
+            self._on_buffer_full()
+        logger.debug("Buffered environmental data for local DB.")
 
     def log_security(self, data: Dict, event_type: str = "motion"):
-        """Log security event to local DB."""
+        """Queue a security event for the next local DB flush."""
+        row = (data.get('timestamp'), event_type, data.get('image_path'), data.get('mode'))
+        with self._buf_lock:
+            self._sec_buf.append(row)
+            pending = len(self._sec_buf)
+        if pending >= BATCH_THRESHOLD:
+            self._on_buffer_full()
+        logger.debug("Buffered security data for local DB.")
+
+    def _on_buffer_full(self):
+        if self.sync_thread is None:
+            # No sync thread to drain the buffer, so flush from the caller
+            self._flush_buffers()
+        else:
+            self._wake.set()
+
+    def flush(self):
+        """Write buffered rows to SQLite now; called on the app's flush tick."""
+        self._flush_buffers()
+
+    def _local_db_missing(self) -> bool:
+        """True if SQLite never opened; logs that once instead of on every flush/sync."""
+        if self._sqlite is not None:
+            return False
+        if not self._reported_no_sqlite:
+            logger.error("Local database unavailable; buffered rows are discarded and cloud sync is idle.")
+            self._reported_no_sqlite = True
+        return True
+
+    def _flush_buffers(self):
+        """Write all buffered rows to SQLite in a single transaction."""
+        with self._buf_lock:
+            env_batch = list(self._env_buf)
+            sec_batch = list(self._sec_buf)
+            self._env_buf.clear()
+            self._sec_buf.clear()
+
+        if not env_batch and not sec_batch:
+            return
+
+        if self._local_db_missing():
+            # Holding the rows would only grow memory, since there is nowhere to write them
+            logger.debug("Dropped %d env / %d security rows.", len(env_batch), len(sec_batch))
+            return
+
         try:
-            ts = data.get('timestamp')
-            img = data.get('image_path')
-            mode = data.get('mode')
-
-            with sqlite3.connect(self.local_db) as conn:
-                conn.execute(
-                    "INSERT INTO security_events (timestamp, event_type, image_path, mode, synced) VALUES (?, ?, ?, ?, 0)",
-                    (ts, event_type, img, mode)
-                )
-            logger.debug("Logged security data locally.")
-        except Exception as e:
-            logger.error(f"Failed to log security data locally: {e}")
+            with self._db_lock:
+                self._sqlite.execute("BEGIN IMMEDIATE")
+                try:
+                    if env_batch:
+                        self._sqlite.executemany(_INSERT_ENV_SQL, env_batch)
+                    if sec_batch:
+                        self._sqlite.executemany(_INSERT_SEC_SQL, sec_batch)
+                    self._sqlite.execute("COMMIT")
+                except sqlite3.Error:
+                    self._sqlite.execute("ROLLBACK")
+                    raise
+            logger.debug("Flushed %d env / %d security rows locally.", len(env_batch), len(sec_batch))
+        except sqlite3.Error as e:
+            logger.error("Failed to flush buffered data locally: %s", e)
+            # Put the rows back so the next flush retries them (rows past maxlen fall off the new end)
+            with self._buf_lock:
+                self._env_buf.extendleft(reversed(env_batch))
+                self._sec_buf.extendleft(reversed(sec_batch))
 
     def _sync_loop(self):
         """Background loop to push unsynced records to Neon."""
         logger.info("Database sync thread started.")
         while self.running:
-            # Check requirements
-            if not self.pg_conn_str or psycopg2 is None:
-                time.sleep(60)
-                continue
+            # Sleep until the interval elapses or enough rows are buffered
+            self._wake.wait(timeout=self.sync_interval)
+            self._wake.clear()
+            if not self.running:
+                break
+
+            self._flush_buffers()
 
             try:
                 # We sync in batches to avoid locking the DB for too long
-                self._sync_measurements()
-                self._sync_security()
+                self._sync_cycle()
             except Exception as e:
-                logger.error(f"Sync cycle error: {e}")
+                logger.error("Sync cycle error: %s", e)
 
-            # Sleep 10 seconds before next sync attempt
-            time.sleep(10)
-
-    def _sync_measurements(self):
-        with sqlite3.connect(self.local_db) as local_conn:
-            local_cur = local_conn.cursor()
-            # 1. Fetch unsynced rows (Batch of 50)
-            local_cur.execute("SELECT id, timestamp, temperature, humidity FROM measurements WHERE synced=0 LIMIT 50")
-            rows = local_cur.fetchall()
+    def _get_pg_conn(self):
+        """Return the cached Postgres connection, reconnecting if it has gone stale."""
+        if self._pg_conn is not None and not self._pg_conn.closed:
+            try:
+                with self._pg_conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                self._pg_conn.rollback()
+                return self._pg_conn
+            except psycopg2.Error as e:
+                logger.info("Postgres connection lost (%s); reconnecting.", e)
+                self._close_pg_conn()
 
-            if not rows:
-                return
+        conn = psycopg2.connect(self.pg_conn_str)
+        try:
+            # Server-side prepared INSERTs live as long as the session does
+            with conn.cursor() as cur:
+                for stmt in _PG_PREPARE_STATEMENTS:
+                    cur.execute(stmt)
+            conn.commit()
+        except psycopg2.Error:
+            conn.close()
+            raise
+        self._pg_conn = conn
+        return self._pg_conn
 
+    def _close_pg_conn(self):
+        if self._pg_conn is not None:
             try:
-                # 2. Push to Neon
-                with psycopg2.connect(self.pg_conn_str) as pg_conn:
-                    with pg_conn.cursor() as pg_cur:
-                        ids_to_mark = []
-                        for row in rows:
-                            row_id, ts, temp, hum = row
-                            pg_cur.execute(
-                                "INSERT INTO measurements (timestamp, temperature, humidity, device_id) VALUES (%s, %s, %s, %s)",
-                                (ts, temp, hum, self.device_id)
-                            )
-                            ids_to_mark.append(row_id)
-
-                        pg_conn.commit()
-
-                        # 3. Mark as synced locally ONLY if Cloud push succeeded
-                        if ids_to_mark:
-                            placeholders = ','.join('?' * len(ids_to_mark))
-                            local_conn.execute(f"UPDATE measurements SET synced=1 WHERE id IN ({placeholders})", ids_to_mark)
-                            local_conn.commit()
-                            logger.info(f"Synced {len(rows)} measurement records to cloud.")
+                self._pg_conn.close()
+            except psycopg2.Error:
+                pass
+        self._pg_conn = None
 
-            except psycopg2.Error as e:
-                logger.warning(f"Postgres connection failed during measurement sync: {e}")
+    def _sync_cycle(self):
+        """Push one batch of each table to Neon inside a single Postgres transaction."""
+        if self._local_db_missing():
+            return
 
-    def _sync_security(self):
-        with sqlite3.connect(self.local_db) as local_conn:
-            local_cur = local_conn.cursor()
-            local_cur.execute("SELECT id, timestamp, event_type, image_path, mode FROM security_events WHERE synced=0 LIMIT 50")
-            rows = local_cur.fetchall()
+        # 1. Fetch unsynced rows (Batch of 50 per table)
+        with self._db_lock:
+            meas_rows = self._sqlite.execute(_SELECT_UNSYNCED_ENV_SQL).fetchall()
+            sec_rows = self._sqlite.execute(_SELECT_UNSYNCED_SEC_SQL).fetchall()
 
-            if not rows:
-                return
+        if not meas_rows and not sec_rows:
+            return
+
+        try:
+            # 2. Push to Neon (both tables, one commit)
+            pg_conn = self._get_pg_conn()
+            with pg_conn:
+                with pg_conn.cursor() as pg_cur:
+                    meas_ids = self._push_measurements(pg_cur, meas_rows)
+                    sec_ids = self._push_security(pg_cur, sec_rows)
+                pg_conn.commit()
+        except psycopg2.Error as e:
+            logger.warning("Postgres connection failed during sync: %s", e)
+            self._close_pg_conn()
+            return
 
+        # 3. Mark as synced locally ONLY if Cloud push succeeded
+        with self._db_lock:
+            self._sqlite.execute("BEGIN IMMEDIATE")
             try:
-                with psycopg2.connect(self.pg_conn_str) as pg_conn:
-                    with pg_conn.cursor() as pg_cur:
-                        ids_to_mark = []
-                        for row in rows:
-                            row_id, ts, evt, img, mode = row
-                            pg_cur.execute(
-                                "INSERT INTO security_events (timestamp, event_type, image_path, mode, device_id) VALUES (%s, %s, %s, %s, %s)",
-                                (ts, evt, img, mode, self.device_id)
-                            )
-                            ids_to_mark.append(row_id)
-
-                        pg_conn.commit()
-
-                        if ids_to_mark:
-                            placeholders = ','.join('?' * len(ids_to_mark))
-                            local_conn.execute(f"UPDATE security_events SET synced=1 WHERE id IN ({placeholders})", ids_to_mark)
-                            local_conn.commit()
-                            logger.info(f"Synced {len(rows)} security records to cloud.")
+                if meas_ids:
+                    self._sqlite.executemany(_UPDATE_MEAS_SYNCED_SQL, [(i,) for i in meas_ids])
+                if sec_ids:
+                    self._sqlite.executemany(_UPDATE_SEC_SYNCED_SQL, [(i,) for i in sec_ids])
+                self._sqlite.execute("COMMIT")
+            except sqlite3.Error:
+                self._sqlite.execute("ROLLBACK")
+                raise
+            # Fold the WAL back a little every cycle rather than in one giant checkpoint later
+            self._sqlite.execute("PRAGMA wal_checkpoint(PASSIVE)")
 
-            except psycopg2.Error as e:
-                logger.warning(f"Postgres connection failed during security sync: {e}")
+        if meas_ids:
+            logger.info("Synced %d measurement records to cloud.", len(meas_ids))
+        if sec_ids:
+            logger.info("Synced %d security records to cloud.", len(sec_ids))
+
+    def _push_measurements(self, pg_cur, rows):
+        """Insert measurement rows on an open cursor; returns the local ids pushed."""
+        if not rows:
+            return []
+        ids_to_mark = [r[0] for r in rows]
+        values = [(ts, temp, hum, self.device_id) for (_row_id, ts, temp, hum) in rows]
+        # execute_batch joins the EXECUTEs into one round-trip per page
+        execute_batch(pg_cur, _PG_EXEC_MEAS_SQL, values, page_size=50)
+        return ids_to_mark
+
+    def _push_security(self, pg_cur, rows):
+        """Insert security event rows on an open cursor; returns the local ids pushed."""
+        if not rows:
+            return []
+        ids_to_mark = [r[0] for r in rows]
+        values = [(ts, evt, img, mode, self.device_id) for (_row_id, ts, evt, img, mode) in rows]
+        execute_batch(pg_cur, _PG_EXEC_SEC_SQL, values, page_size=50)
+        return ids_to_mark
 
     def close(self):
         """Stop the sync thread gracefully."""
         self.running = False
-        if self.sync_thread.is_alive():
-            self.sync_thread.join(timeout=2)
\ No newline at end of file
+        self._wake.set()
+        if self.sync_thread is not None and self.sync_thread.is_alive():
+            self.sync_thread.join(timeout=2)
+        self._flush_buffers()
+        if psycopg2 is not None:
+            self._close_pg_conn()
+        with self._db_lock:
+            if self._sqlite is not None:
+                self._sqlite.close()
+                self._sqlite = None
\ No newline at end of file
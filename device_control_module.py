@@ -5,89 +5,63 @@
 
 from __future__ import annotations
 
-import json
+import glob
 import logging
+import os
 import threading
 import time
-from datetime import datetime
-from typing import Dict, List
-
-try:
-    import board
-    import digitalio
-except ImportError:  # pragma: no cover - running off Pi
-    board = None  # type: ignore
-    digitalio = None  # type: ignore
-
-try:
-    # Pi 5 / newer (BCM2712)
-    from adafruit_blinka.microcontroller.bcm2712 import pin as _pinmap
-except ImportError:
-    # Pi 4 / older (BCM283x)
-    from adafruit_blinka.microcontroller.bcm283x import pin as _pinmap
+from collections import namedtuple
+from itertools import repeat
+from typing import Any, Callable, Dict, List, Mapping, Optional
 
+from config_loader import read_config_file
+from jeefhs_gpio_util import resolve_pin
+from jeefhs_time import now_iso
 
 logger = logging.getLogger(__name__)
 
+# One actuator entry in a status report; use ._asdict() where a dict is needed
+StatusRow = namedtuple("StatusRow", "timestamp device_name status")
 
-def resolve_pin(pin_spec):
-    """Return a pin object suitable for digitalio.DigitalInOut based on config.
-    Accepts:
-      - "D13", "D21", etc.
-      - "GPIO13", "GPIO21", etc.
-      - "BCM:13"
-      - int 13
-    We'll ultimately map to _pinmap.GPIO13 etc.
-    """
-    if pin_spec is None:
-        raise RuntimeError("GPIO pin specification missing in config")
-
-    def _gpio_obj_from_int(n: int):
-        # turn 13 -> "GPIO13", look that up on _pinmap
-        attr = f"GPIO{n}"
-        if hasattr(_pinmap, attr):
-            return getattr(_pinmap, attr)
-
-        # Fallback: some Blinka/board mappings expose D<nn> or GP<nn> on the
-        # `board` module instead of GPIO<nn> on the microcontroller pinmap.
-        # Try a few common attribute names on `board` before failing so the
-        # code is more portable across Pi models and Blinka versions.
-        if board is not None:
-            for cand in (f"D{n}", f"GP{n}", attr):
-                if hasattr(board, cand):
-                    return getattr(board, cand)
-
-        raise RuntimeError(f"No {attr} in this Pi's pin map")
-
-    # int form (ex: 13)
-    if isinstance(pin_spec, int):
-        return _gpio_obj_from_int(pin_spec)
-
-    # string form
-    if isinstance(pin_spec, str):
-        spec = pin_spec.strip()
-
-        # BCM:13
-        if spec.upper().startswith("BCM:"):
-            try:
-                bcm_pin = int(spec.split(":",1)[1])
-            except ValueError as exc:
-                raise RuntimeError(f"Invalid BCM pin declaration '{spec}'") from exc
-            return _gpio_obj_from_int(bcm_pin)
+_UNLOADED = object()
+_digitalio = _UNLOADED
 
-        # D13, D21, etc. -> strip leading D and treat rest as number
-        if spec.upper().startswith("D") and spec[1:].isdigit():
-            return _gpio_obj_from_int(int(spec[1:]))
 
-        # GPIO13 direct
-        if spec.upper().startswith("GPIO") and spec[4:].isdigit():
-            return _gpio_obj_from_int(int(spec[4:]))
+def _get_digitalio():
+    """Import Blinka's digitalio on first use; None when running off Pi."""
+    global _digitalio
+    if _digitalio is _UNLOADED:
+        try:
+            import digitalio as _digitalio_mod
+        except ImportError:  # pragma: no cover - running off Pi
+            _digitalio_mod = None
+        _digitalio = _digitalio_mod
+    return _digitalio
 
-        raise RuntimeError(f"Unsupported pin string '{spec}'")
 
-    raise TypeError(f"Unsupported pin specification type: {type(pin_spec)}")
+_sysfs_gpio_base = _UNLOADED
 
 
+def _get_sysfs_gpio_base() -> Optional[int]:
+    """Global sysfs number of BCM GPIO0 (512 on 6.6+ kernels, 0 before); None if not found."""
+    global _sysfs_gpio_base
+    if _sysfs_gpio_base is _UNLOADED:
+        bases = {}
+        for chip_dir in sorted(glob.glob("/sys/class/gpio/gpiochip*")):
+            try:
+                with open(os.path.join(chip_dir, "label")) as handle:
+                    label = handle.read().strip()
+                with open(os.path.join(chip_dir, "base")) as handle:
+                    bases.setdefault(label, int(handle.read()))
+            except (OSError, ValueError):
+                continue
+        # The header bank: the RP1 on a Pi 5 (whose pinctrl-bcm2712 chips are SoC-internal),
+        # otherwise the SoC's own pinctrl-bcm2835/bcm2711 chip
+        base = bases.get("pinctrl-rp1")
+        if base is None:
+            base = next((b for label, b in bases.items() if label.startswith("pinctrl-bcm")), None)
+        _sysfs_gpio_base = base
+    return _sysfs_gpio_base
 
 
 class _OutputWrapper:
@@ -98,7 +72,8 @@ class _OutputWrapper:
         self._value = False
         self._io = None
 
-        if digitalio is not None and not isinstance(pin, int):
+        digitalio = _get_digitalio() if not isinstance(pin, int) else None
+        if digitalio is not None:
             try:
                 dio = digitalio.DigitalInOut(pin)
                 dio.direction = digitalio.Direction.OUTPUT
@@ -108,17 +83,47 @@ class _OutputWrapper:
             except Exception as exc:  # pragma: no cover - hardware failure path
                 logger.warning("Falling back to software stub for %s (%s)", name, exc)
 
+        # Where Blinka drives the line through sysfs, write its value file
+        # directly instead of going through the DigitalInOut property stack.
+        # Reads go through the same fd, so set() and resync() always agree.
+        self._sysfs_fd: int | None = None
+        base = _get_sysfs_gpio_base() if self._io is not None else None
+        if base is not None:
+            # sysfs numbers lines globally: the chip's base plus the BCM offset
+            value_path = f"/sys/class/gpio/gpio{base + int(getattr(pin, 'id', pin))}/value"
+            if os.path.exists(value_path):
+                try:
+                    self._sysfs_fd = os.open(value_path, os.O_RDWR)
+                except OSError as exc:  # pragma: no cover - permissions
+                    logger.info("sysfs fast path unavailable for %s (%s)", name, exc)
+        if self._sysfs_fd is not None:
+            logger.info("%s writes via sysfs %s", name, value_path)
+        elif self._io is not None:
+            logger.info("%s writes via Blinka DigitalInOut", name)
+
     def set(self, on: bool):
         self._value = bool(on)
-        if self._io is not None:
+        if self._sysfs_fd is not None:
+            os.pwrite(self._sysfs_fd, b"1" if self._value else b"0", 0)
+        elif self._io is not None:
             self._io.value = self._value
 
     def get(self) -> bool:
-        if self._io is not None:
-            return bool(self._io.value)
+        # The wrapper is the only writer, so the cached value is authoritative
+        return self._value
+
+    def resync(self) -> bool:
+        """Re-read the physical line state into the cache and return it."""
+        if self._sysfs_fd is not None:
+            self._value = os.pread(self._sysfs_fd, 1, 0) == b"1"
+        elif self._io is not None:
+            self._value = bool(self._io.value)
         return self._value
 
     def close(self):
+        if self._sysfs_fd is not None:
+            os.close(self._sysfs_fd)
+            self._sysfs_fd = None
         if self._io is not None:
             try:
                 self._io.deinit()
@@ -132,20 +137,44 @@ class device_control_module:
     REQUIRED_DEVICES = ("red_led", "green_led", "blue_led", "fan", "buzzer")
     CONTROLLABLE_DEVICES = ("red_led", "green_led", "blue_led", "fan")
 
-    _setup_lock = threading.Lock()
-
-    def __init__(self, config_file: str = "config.json"):
+    # Bit i of _state_bits / slot i of _outputs_arr belongs to REQUIRED_DEVICES[i]
+    _DEVICE_INDEX = dict(zip(REQUIRED_DEVICES, range(len(REQUIRED_DEVICES))))
+    _CONTROLLABLE_INDEX = {"red_led": 0, "green_led": 1, "blue_led": 2, "fan": 3}
+    _BUZZER_IDX = 4
+    _BUZZER_MASK = 1 << _BUZZER_IDX
+    _LED_SET = frozenset(("red_led", "green_led", "blue_led"))
+    # _STATUS_BY_BITS[bits] is the "on"/"off" tuple for every device, in REQUIRED_DEVICES order
+    _STATUS_BY_BITS = tuple(
+        tuple("on" if bits >> i & 1 else "off" for i in range(5)) for bits in range(1 << 5)
+    )
+
+    STATE_FLUSH_DELAY_S = 0.05
+    BUSY_WAIT_MAX_S = 0.002  # buzzer pulses shorter than this are timed by spinning
+
+    def __init__(
+        self,
+        config_file: str = "config.json",
+        on_state_flush: Optional[Callable[[Dict[str, str]], None]] = None,
+    ):
         self.config = self.load_config(config_file)
-        self._outputs: Dict[str, _OutputWrapper] = {}
-        self._states: Dict[str, str] = {}
+        self._outputs_arr: List[_OutputWrapper | None] = [None] * len(self.REQUIRED_DEVICES)
+        self._state_bits = 0
+        self._state_lock = threading.Lock()
         self._pulse_duration = float(self.config.get("buzzer_pulse_duration_s", 0.5))
+        self._buzzer_lock = threading.Lock()
+        self._buzzer_timer: threading.Timer | None = None
+        self._buzzer_gen = 0  # bumped per timed pulse so a superseded timer can tell it is stale
+        # Toggles landing within STATE_FLUSH_DELAY_S are reported to on_state_flush together
+        self._on_state_flush = on_state_flush
+        self._pending_changes: set[str] = set()
+        self._pending_lock = threading.Lock()
+        self._flush_timer: threading.Timer | None = None
         self._initialise_outputs()
 
-    def load_config(self, config_file: str) -> dict:
-        """Load configuration from JSON file."""
+    def load_config(self, config_file: str) -> Mapping[str, Any]:
+        """Load configuration from JSON file (cached parse, private copy)."""
         try:
-            with open(config_file, "r", encoding="utf-8") as handle:
-                return json.load(handle)
+            return read_config_file(config_file)
         except FileNotFoundError as exc:  # pragma: no cover - config enforced by caller
             raise RuntimeError(f"Config file {config_file} not found") from exc
 
@@ -158,78 +187,170 @@ class device_control_module:
         if missing:
             raise RuntimeError(f"Missing pin assignments for: {', '.join(missing)}")
 
-        with self._setup_lock:
-            for name in self.REQUIRED_DEVICES:
-                pin = resolve_pin(pins_cfg.get(name))
-                self._outputs[name] = _OutputWrapper(name, pin)
-                self._outputs[name].set(False)
-                self._states[name] = "off"
+        # Runs once from __init__ before the instance is shared, so no lock is needed
+        for idx, name in enumerate(self.REQUIRED_DEVICES):
+            pin = resolve_pin(pins_cfg.get(name))
+            output = _OutputWrapper(name, pin)
+            output.set(False)
+            self._outputs_arr[idx] = output
+        self._state_bits = 0
 
     # ------------------------------------------------------------------
     # Public API used by JeefHSApp / MQTT callbacks
     # ------------------------------------------------------------------
+    def _apply(self, idx: int, on: bool) -> bool:
+        """Drive output idx to on/off; returns True if its state changed."""
+        mask = 1 << idx
+        with self._state_lock:
+            if bool(self._state_bits & mask) == on:
+                return False
+            output = self._outputs_arr[idx]
+            if output is None:
+                logger.warning("Attempted to toggle uninitialised device %s", self.REQUIRED_DEVICES[idx])
+                return False
+            output.set(on)
+            if on:
+                self._state_bits |= mask
+            else:
+                self._state_bits &= ~mask
+        return True
+
     def set_device_state(self, device_name: str, on: bool) -> bool:
         """Toggle controllable devices; returns True if a state change occurred."""
         device = device_name.lower()
-        if device not in self.CONTROLLABLE_DEVICES:
+        idx = self._CONTROLLABLE_INDEX.get(device)
+        if idx is None:
             logger.debug("Ignoring unsupported device toggle for %s", device_name)
             return False
 
-        target_state = "on" if on else "off"
-        if self._states.get(device) == target_state:
-            return False
-
-        output = self._outputs.get(device)
-        if output is None:
-            logger.warning("Attempted to toggle uninitialised device %s", device)
+        on = bool(on)
+        if not self._apply(idx, on):
             return False
 
-        output.set(on)
-        self._states[device] = target_state
+        self._queue_changes((device,))
+        target_state = "on" if on else "off"
         # Avoid noisy INFO logs for individual LEDs; keep INFO for other devices.
-        if device in {"red_led", "green_led", "blue_led"}:
-            logger.debug("Set %s to %s", device, target_state)
-        else:
-            logger.info("Set %s to %s", device, target_state)
+        (logger.debug if device in self._LED_SET else logger.info)("Set %s to %s", device, target_state)
         return True
 
+    def set_device_states(self, updates: Dict[str, bool]) -> List[str]:
+        """Apply several toggles in one pass; returns the devices that changed.
+
+        Only lines whose state actually differs are written: one GPIO write
+        per changed line, none for devices a pattern step leaves untouched.
+        """
+        changed: List[str] = []
+        for device_name, on in updates.items():
+            device = device_name.lower()
+            idx = self._CONTROLLABLE_INDEX.get(device)
+            if idx is None:
+                logger.debug("Ignoring unsupported device toggle for %s", device_name)
+                continue
+            if self._apply(idx, bool(on)):
+                changed.append(device)
+
+        if changed:
+            self._queue_changes(changed)
+            logger.debug("Batch update changed %s", ", ".join(changed))
+        return changed
+
+    def _queue_changes(self, devices) -> None:
+        if self._on_state_flush is None:
+            return
+        with self._pending_lock:
+            self._pending_changes.update(devices)
+            if self._flush_timer is None:
+                timer = threading.Timer(self.STATE_FLUSH_DELAY_S, self.flush_pending_changes)
+                timer.daemon = True
+                self._flush_timer = timer
+                timer.start()
+
+    def flush_pending_changes(self) -> None:
+        """Deliver every device changed since the last flush to on_state_flush."""
+        with self._pending_lock:
+            self._flush_timer = None
+            changes, self._pending_changes = self._pending_changes, set()
+        if not changes or self._on_state_flush is None:
+            return
+
+        states = self._STATUS_BY_BITS[self._state_bits]
+        index = self._DEVICE_INDEX
+        try:
+            self._on_state_flush({name: states[index[name]] for name in changes})
+        except Exception as exc:
+            logger.warning("State flush handler failed: %s", exc)
+
     def pulse_buzzer(self, duration: float | None = None) -> None:
-        """Momentarily activate the buzzer for alerts."""
-        buzzer = self._outputs.get("buzzer")
+        """Momentarily activate the buzzer for alerts without blocking the caller."""
+        buzzer = self._outputs_arr[self._BUZZER_IDX]
         if buzzer is None:
             logger.warning("Buzzer not configured; pulse ignored")
             return
 
-        pulse_for = duration if duration is not None else self._pulse_duration
-        logger.info("Pulsing buzzer for %.2f seconds", pulse_for)
-        self._states["buzzer"] = "on"
-        buzzer.set(True)
-        time.sleep(max(pulse_for, 0.1))
-        buzzer.set(False)
-        self._states["buzzer"] = "off"
-
-    def get_all_status(self) -> List[Dict[str, str]]:
+        pulse_for = max(duration if duration is not None else self._pulse_duration, 0.0)
+        logger.info("Pulsing buzzer for %.3f seconds", pulse_for)
+        with self._buzzer_lock:
+            if pulse_for < self.BUSY_WAIT_MAX_S:
+                # Timer/sleep wake-up jitter is ~1 ms, so spin for very short pulses.
+                # A longer pulse already in progress covers this one.
+                if self._buzzer_timer is None:
+                    deadline = time.perf_counter_ns() + int(pulse_for * 1e9)
+                    with self._state_lock:
+                        buzzer.set(True)
+                        self._state_bits |= self._BUZZER_MASK
+                    # Spin holding only _buzzer_lock: it already serialises every buzzer write,
+                    # and other devices' toggles shouldn't wait out the pulse.
+                    while time.perf_counter_ns() < deadline:
+                        pass
+                    with self._state_lock:
+                        buzzer.set(False)
+                        self._state_bits &= ~self._BUZZER_MASK
+                return
+
+            # A pulse arriving mid-pulse extends it rather than stacking timers
+            if self._buzzer_timer is not None:
+                self._buzzer_timer.cancel()
+            with self._state_lock:
+                buzzer.set(True)
+                self._state_bits |= self._BUZZER_MASK
+            self._buzzer_gen += 1
+            timer = threading.Timer(pulse_for, self._end_buzzer_pulse, args=(self._buzzer_gen,))
+            timer.daemon = True
+            self._buzzer_timer = timer
+            timer.start()
+
+    def _end_buzzer_pulse(self, gen: int) -> None:
+        with self._buzzer_lock:
+            if gen != self._buzzer_gen:
+                # Fired just as an extension cancelled it; the newer timer ends the pulse
+                return
+            self._buzzer_timer = None
+            with self._state_lock:
+                buzzer = self._outputs_arr[self._BUZZER_IDX]
+                if buzzer is not None:
+                    buzzer.set(False)
+                self._state_bits &= ~self._BUZZER_MASK
+
+    @property
+    def state_bits(self) -> int:
+        """Packed on/off state; bit i is REQUIRED_DEVICES[i]."""
+        return self._state_bits
+
+    def get_all_status(self) -> List[StatusRow]:
         """Report the latest known state of every actuator."""
-        timestamp = datetime.now().isoformat()
-        status_report: List[Dict[str, str]] = []
-        for name in self.REQUIRED_DEVICES:
-            state = self._states.get(name, "off")
-            status_report.append({
-                "timestamp": timestamp,
-                "device_name": name,
-                "status": state
-            })
-        return status_report
+        timestamp = now_iso()
+        states = self._STATUS_BY_BITS[self._state_bits]
+        return list(map(StatusRow, repeat(timestamp), self.REQUIRED_DEVICES, states))
 
     # ------------------------------------------------------------------
     # Compatibility helpers used by legacy code paths
     # ------------------------------------------------------------------
     def generate_device_status(self) -> List[Dict[str, str]]:
-        return self.get_all_status()
+        return [row._asdict() for row in self.get_all_status()]
 
     def get_device_status(self) -> List[Dict[str, str]]:
         try:
-            report = self.get_all_status()
+            report = self.generate_device_status()
             logger.debug("Device status requested; %d entries", len(report))
             return report
         except Exception as exc:  # pragma: no cover - defensive guard
@@ -237,6 +358,16 @@ class device_control_module:
             return []
 
     def cleanup(self) -> None:
-        for output in self._outputs.values():
-            output.close()
-        self._outputs.clear()
\ No newline at end of file
+        with self._pending_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._pending_changes.clear()
+        with self._buzzer_lock:
+            if self._buzzer_timer is not None:
+                self._buzzer_timer.cancel()
+                self._buzzer_timer = None
+        for idx, output in enumerate(self._outputs_arr):
+            if output is not None:
+                output.close()
+            self._outputs_arr[idx] = None
\ No newline at end of file
@@ -1,59 +1,25 @@
-import json
 import time
 import random
 import math
-from datetime import datetime
+import threading
 import logging
-import board
+from typing import Optional
+
+from config_loader import read_config_file
+from jeefhs_gpio_util import resolve_pin
+from jeefhs_time import now_iso
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# --- Robust Pin Resolution ---
-try:
-    # Pi 5 / newer (BCM2712)
-    from adafruit_blinka.microcontroller.bcm2712 import pin as _pinmap
-except ImportError:
-    try:
-        # Pi 4 / older (BCM283x)
-        from adafruit_blinka.microcontroller.bcm283x import pin as _pinmap
-    except ImportError:
-        _pinmap = None
-
-def resolve_pin(pin_spec):
-    if pin_spec is None:
-        return None
-
-    def _gpio_obj_from_int(n: int):
-        if _pinmap:
-            attr = f"GPIO{n}"
-            if hasattr(_pinmap, attr):
-                return getattr(_pinmap, attr)
-        for cand in (f"D{n}", f"GP{n}", f"GPIO{n}"):
-            if hasattr(board, cand):
-                return getattr(board, cand)
-        raise RuntimeError(f"Could not resolve pin {n} on this device.")
-
-    if isinstance(pin_spec, int):
-        return _gpio_obj_from_int(pin_spec)
-
-    if isinstance(pin_spec, str):
-        spec = pin_spec.strip().upper()
-        if spec.startswith("BCM:"):
-            try:
-                bcm_pin = int(spec.split(":", 1)[1])
-                return _gpio_obj_from_int(bcm_pin)
-            except ValueError:
-                raise RuntimeError(f"Invalid BCM format: {pin_spec}")
-        if spec.startswith("D") and spec[1:].isdigit():
-            return _gpio_obj_from_int(int(spec[1:]))
-        if spec.startswith("GPIO") and spec[4:].isdigit():
-            return _gpio_obj_from_int(int(spec[4:]))
-        if hasattr(board, spec):
-            return getattr(board, spec)
+# Simulation curve: one table entry per degree of the original sin(t / 3600) wave
+_SIN_TABLE = tuple(math.sin(i * math.pi / 180) for i in range(360))
+_SECONDS_PER_DEGREE = 3600 * math.pi / 180
 
-    raise ValueError(f"Unsupported pin specification: {pin_spec}")
+
+def _round1(x: float) -> float:
+    """Round half away from zero to one decimal place without round()'s dtoa path."""
+    # Divide (not multiply by 0.1) so 23.4 stays 23.4 rather than 23.400000000000002
+    return int(x * 10 + (0.5 if x >= 0 else -0.5)) / 10
 
 
 class environmental_module:
@@ -61,6 +27,12 @@ class environmental_module:
         self.config = self.load_config(config_file)
         self._dht = None
 
+        # Latest good DHT reading as (monotonic time, temperature, humidity);
+        # replaced wholesale by the poller, so readers never see a torn value.
+        self._snapshot = None
+        self._stop_event = threading.Event()
+        self._poll_thread = None
+
         if self.config.get("use_dht", False):
             try:
                 import adafruit_dht
@@ -70,80 +42,99 @@ class environmental_module:
                 if not dht_pin_spec:
                     raise ValueError("Key 'dht' is missing in config.json PINS")
                 
-                dht_pin = resolve_pin(dht_pin_spec)
-                logger.info(f"Initializing DHT11 on pin: {dht_pin}")
+                # One module serves both sensor models; config picks which driver to build
+                model = str(self.config.get("env_sensor", "DHT11")).upper()
+                sensor_cls = {"DHT11": adafruit_dht.DHT11, "DHT22": adafruit_dht.DHT22}.get(model)
+                if sensor_cls is None:
+                    raise ValueError(f"Unsupported env_sensor '{model}' (expected DHT11 or DHT22)")
 
-                # --- CHANGE IS HERE: DHT11 instead of DHT22 ---
-                self._dht = adafruit_dht.DHT11(dht_pin, use_pulseio=False)
-                logger.info("DHT11 Sensor successfully initialized.")
+                dht_pin = resolve_pin(dht_pin_spec)
+                logger.info("Initializing %s on pin: %s", model, dht_pin)
+                self._dht = sensor_cls(dht_pin, use_pulseio=False)
+                logger.info("%s Sensor successfully initialized.", model)
 
             except ImportError:
                 logger.error("Failed to import 'adafruit_dht'. Is the library installed?")
                 self._dht = None
             except Exception as e:
-                logger.warning(f"DHT11 init failed ({type(e).__name__}): {e}")
+                logger.warning("DHT init failed (%s): %s", type(e).__name__, e)
                 logger.warning("System will fall back to SIMULATED data.")
                 self._dht = None
         else:
             logger.info("DHT Sensor disabled in config. Using simulation.")
 
+        if self._dht:
+            self._poll_thread = threading.Thread(target=self._dht_poll_loop, name="DHTPoller", daemon=True)
+            self._poll_thread.start()
+
     def load_config(self, config_file):
         default_config = {
-            "dht_read_retries": 3,
-            "dht_retry_delay_s": 2.0
+            "dht_poll_interval_s": 2.0,
+            "dht_max_age_s": 30.0
         }
         try:
-            with open(config_file, 'r') as f:
-                config = json.load(f)
-                return {**default_config, **config}
+            return {**default_config, **read_config_file(config_file)}
         except FileNotFoundError:
-            logger.warning(f"Config file {config_file} not found, using defaults")
+            logger.warning("Config file %s not found, using defaults", config_file)
             return default_config
 
-    def get_environmental_data(self):
+    def _dht_poll_loop(self):
+        """Read the DHT at its own cadence and publish the latest good value."""
+        interval = float(self.config.get('dht_poll_interval_s', 2.0))
+        while not self._stop_event.is_set():
+            try:
+                t = self._dht.temperature
+                h = self._dht.humidity
+                if t is not None and h is not None:
+                    self._snapshot = (time.monotonic(), _round1(float(t)), _round1(float(h)))
+            except RuntimeError as e:
+                # DHT checksum/timing errors are routine; the next poll retries
+                logger.debug("DHT read failed: %s", e)
+            except Exception as e:
+                logger.error("Unexpected DHT error: %s", e)
+            self._stop_event.wait(interval)
+
+    def get_environmental_data(self, timestamp: Optional[str] = None):
         temperature_c, humidity = 0, 0
         source = 'simulated'
 
         if self._dht:
-            retries = int(self.config.get('dht_read_retries', 3))
-            delay = float(self.config.get('dht_retry_delay_s', 2.0))
-            
-            for attempt in range(1, retries + 1):
-                try:
-                    t = self._dht.temperature
-                    h = self._dht.humidity
-                    
-                    if t is not None and h is not None:
-                        temperature_c = round(float(t), 1)
-                        humidity = round(float(h), 1)
-                        source = 'sensor'
-                        return {
-                            'timestamp': datetime.now().isoformat(),
-                            'temperature': temperature_c,
-                            'humidity': humidity,
-                            'source': source
-                        }
-                except RuntimeError as e:
-                    logger.warning(f"DHT Read attempt {attempt} failed: {e}")
-                    time.sleep(delay)
-                except Exception as e:
-                    logger.error(f"Unexpected DHT error: {e}")
-                    break
-            
-            logger.warning("All DHT read attempts failed. Returning simulated data.")
+            snapshot = self._snapshot
+            max_age = float(self.config.get('dht_max_age_s', 30.0))
+            if snapshot is not None and time.monotonic() - snapshot[0] <= max_age:
+                _, temperature_c, humidity = snapshot
+                return {
+                    'timestamp': timestamp or now_iso(),
+                    'temperature': temperature_c,
+                    'humidity': humidity,
+                    'source': 'sensor'
+                }
+
+            logger.warning("No recent DHT reading. Returning simulated data.")
 
         # Fallback Simulation
         try:
-            base_temp = 22 + 5 * math.sin(time.time() / 3600)
-            temperature_c = round(base_temp + random.uniform(-2, 2), 1)
-            humidity = round(60 - (temperature_c - 20) * 2 + random.uniform(-5, 5), 1)
+            idx = int(time.time() / _SECONDS_PER_DEGREE) % 360
+            base_temp = 22 + 5 * _SIN_TABLE[idx]
+            temperature_c = _round1(base_temp + random.random() * 4 - 2)
+            humidity = _round1(60 - (temperature_c - 20) * 2 + random.random() * 10 - 5)
             humidity = max(30, min(90, humidity))
         except Exception:
             pass
 
         return {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': timestamp or now_iso(),
             'temperature': temperature_c,
             'humidity': humidity,
             'source': source
-        }
\ No newline at end of file
+        }
+
+    def close(self):
+        self._stop_event.set()
+        if self._poll_thread is not None:
+            self._poll_thread.join(timeout=5)
+        if self._dht is not None:
+            try:
+                self._dht.exit()
+            except Exception:
+                pass
\ No newline at end of file
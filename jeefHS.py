@@ -10,22 +10,91 @@ import logging
 import os
 import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Optional
 
 from dotenv import load_dotenv  # NEW: For loading secrets
 
+try:
+    import orjson
+except ImportError:  # stdlib json fallback for hosts without orjson
+    orjson = None
+
+from config_loader import read_config_file
 from MQTT_communicator import MQTT_communicator
 from environmental_module import environmental_module
 from security_module import security_module
 from device_control_module import device_control_module
 from mode_manager import ModeManager
 from database_interface import DatabaseInterface  # NEW: For cloud sync
+from jeefhs_time import now_iso
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+LOG_BUFFER_SIZE = 64 * 1024
+
+
+@dataclass(slots=True)
+class LogEntry:
+    """One line of the daily JSONL log."""
+
+    timestamp: str
+    temperature: Optional[float]
+    humidity: Optional[float]
+    motion_detected: bool
+    image_path: Optional[str]
+    mode: str
+    actuators: Dict[str, str]
+    buzzer_triggered: bool
+    environment_source: Optional[str] = None
+    event: Optional[str] = None
+
+
+# Optional keys are left out of a line entirely when unset, as log readers expect.
+# Neither name occurs anywhere else in a line, so the unset pairs can be cut from the bytes.
+_LOG_OPTIONAL_FIELDS = ('environment_source', 'event')
+_UNSET_OPTIONAL_PAIRS = tuple(f',"{name}":null'.encode() for name in _LOG_OPTIONAL_FIELDS)
+
+
+if orjson is not None:
+    def _encode_log_line(entry: LogEntry) -> bytes:
+        # orjson serialises the slots dataclass natively, without an intermediate dict
+        line = orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE)
+        for pair in _UNSET_OPTIONAL_PAIRS:
+            line = line.replace(pair, b'', 1)
+        return line
+else:
+    def _encode_log_line(entry: LogEntry) -> bytes:
+        record = asdict(entry)
+        for name in _LOG_OPTIONAL_FIELDS:
+            if record[name] is None:
+                del record[name]
+        return json.dumps(record).encode('utf-8') + b'\n'
+
+# The log is append-only, so syncing data without metadata suffices (fsync where unavailable)
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+# Party mode pattern: (LEDs lit, seconds to hold), expanded once into full LED state maps
+_PARTY_LEDS = ('red_led', 'green_led', 'blue_led')
+PARTY_SEQUENCE = tuple(
+    ({name: name in lit for name in _PARTY_LEDS}, delay)
+    for lit, delay in (
+        (('red_led',), 0.3),
+        (('green_led',), 0.3),
+        (('blue_led',), 0.3),
+        (('red_led', 'green_led'), 0.25),
+        (('green_led', 'blue_led'), 0.25),
+        (('red_led', 'blue_led'), 0.25),
+        (('red_led', 'green_led', 'blue_led'), 0.5),
+        ((), 0.2),
+    )
+)
+PARTY_ALL_OFF = {name: False for name in _PARTY_LEDS}
+
 
 class JeefHSApp:
     """Coordinates sensors, actuators, MQTT, database sync, and daily logging."""
@@ -41,6 +110,7 @@ class JeefHSApp:
         self.env_feeds = self.config.get("ENV_FEEDS", {})
         self.security_feeds = self.config.get("SECURITY_FEEDS", {})
         self.status_feeds = self.config.get("STATUS_FEEDS", {})
+        self.group_feed = self.config.get("GROUP_FEED")
         self.heartbeat_feed = self.config.get("HEARTBEAT_FEED")
         self.heartbeat_interval = int(self.config.get("heartbeat_interval", 30))
 
@@ -48,7 +118,10 @@ class JeefHSApp:
         self.db = DatabaseInterface(self.config)
 
         self.mode_manager = ModeManager()
-        self.device_controller = device_control_module(config_file)
+        self.device_controller = device_control_module(
+            config_file,
+            on_state_flush=self._publish_device_states,
+        )
 
         # Party mode state
         self._party_thread = None
@@ -75,8 +148,14 @@ class JeefHSApp:
         self._log_handle: Optional[object] = None
         self._log_date: Optional[str] = None
         self._needs_flush = False
-        self._last_flush_time = time.time()
-        self._last_heartbeat_time = 0.0
+        # Interval bookkeeping uses time.monotonic() so NTP/wall-clock jumps can't stall or burst it
+        self._last_flush_time = time.monotonic()
+        self._last_heartbeat_time = float('-inf')
+        # Disk barriers (log fdatasync + SQLite commit) run off the sensor loop
+        self._io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="JeefHSFlush")
+        self._flush_future: Optional[Future] = None
+        self._actuator_state_cache: Dict[str, str] = {}
+        self._actuator_cache_bits = -1
 
         self.last_env_data: Dict[str, Optional[str]] = {}
         self.last_security_data: Dict[str, Optional[str]] = {
@@ -103,8 +182,7 @@ class JeefHSApp:
         }
 
         try:
-            with open(config_file, 'r', encoding='utf-8') as handle:
-                user_config = json.load(handle)
+            user_config = read_config_file(config_file)
         except FileNotFoundError as exc:
             raise RuntimeError(f"Config file {config_file} not found") from exc
         except json.JSONDecodeError as exc:
@@ -124,7 +202,12 @@ class JeefHSApp:
     # ------------------------------------------------------------------
     # Cloud publishing
     # ------------------------------------------------------------------
-    def send_to_cloud(self, data: dict, feeds: dict[str, str]) -> bool:
+    def send_to_cloud(self, data: dict, feeds: dict[str, str], group: Optional[str] = None) -> bool:
+        if group:
+            # One group message carries every feed value for this tick
+            values = {feed: data[key] for key, feed in feeds.items() if data.get(key) is not None}
+            return self.mqtt_agent.send_group_to_adafruit_io(group, values)
+
         success = True
         for key, feed in feeds.items():
             if key not in data:
@@ -132,23 +215,29 @@ class JeefHSApp:
             value = data.get(key)
             if value is None:
                 continue
+            # Queued for the MQTT worker, which paces publishes to the broker's rate limit
             ok = self.mqtt_agent.send_to_adafruit_io(feed, value)
             success = success and ok
-            time.sleep(0.5)
         return success
 
     # ------------------------------------------------------------------
     # Data collection
     # ------------------------------------------------------------------
-    def collect_environmental_data(self, current_time: float, timers: dict) -> None:
+    def collect_environmental_data(
+        self,
+        current_time: float,
+        timers: dict,
+        timestamp_iso: Optional[str] = None,
+    ) -> None:
         if current_time - timers['env_check'] < self.env_interval:
             return
 
-        env_data = self.env_data.get_environmental_data()
+        timestamp_iso = timestamp_iso or now_iso()
+        env_data = self.env_data.get_environmental_data(timestamp=timestamp_iso)
         self.last_env_data = env_data
 
         # 1. Log to local JSONL file
-        self._write_log_entry(event_type='environmental', env_data=env_data)
+        self._write_log_entry(event_type='environmental', env_data=env_data, timestamp=timestamp_iso)
 
         # 2. Log to Database (SQLite -> Cloud Sync)
         self.db.log_environment(env_data)
@@ -156,7 +245,7 @@ class JeefHSApp:
         # 3. Publish Live Data to Adafruit IO
         source = env_data.get('source')
         if source in {'sensor', 'simulated'}:
-            if self.send_to_cloud(env_data, self.env_feeds):
+            if self.send_to_cloud(env_data, self.env_feeds, group=self.group_feed):
                 logger.info("Environmental data sent to MQTT (%s)", source)
             else:
                 logger.warning("Failed to send environmental data via MQTT")
@@ -165,9 +254,16 @@ class JeefHSApp:
 
         timers['env_check'] = current_time
 
-    def collect_security_data(self, current_time: float, timers: dict, security_counts: dict) -> None:
+    def collect_security_data(
+        self,
+        current_time: float,
+        timers: dict,
+        security_counts: dict,
+        timestamp_iso: Optional[str] = None,
+    ) -> None:
+        timestamp_iso = timestamp_iso or now_iso()
         if current_time - timers['security_check'] >= self.security_check_interval:
-            sec_data = self.security_data.get_security_data()
+            sec_data = self.security_data.get_security_data(timestamp=timestamp_iso)
             sec_data.setdefault('mode', self.mode_manager.get_mode())
             self.last_security_data = sec_data
 
@@ -176,7 +272,7 @@ class JeefHSApp:
                 logger.warning("Motion detected! Total: %s", security_counts['motion'])
                 
                 # 1. Log to local JSONL
-                self._write_log_entry(event_type='motion', security_data=sec_data)
+                self._write_log_entry(event_type='motion', security_data=sec_data, timestamp=timestamp_iso)
                 
                 # 2. Log to Database (SQLite -> Cloud Sync)
                 self.db.log_security(sec_data, event_type="motion")
@@ -185,7 +281,7 @@ class JeefHSApp:
 
         if current_time - timers['security_send'] >= self.security_send_interval:
             summary = {
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': timestamp_iso,
                 'motion_count': security_counts['motion'],
             }
             if self.send_to_cloud(summary, self.security_feeds):
@@ -211,20 +307,25 @@ class JeefHSApp:
 
         if self._log_handle is not None:
             self._log_handle.flush()
-            os.fsync(self._log_handle.fileno())
+            _fdatasync(self._log_handle.fileno())
             self._log_handle.close()
             self._needs_flush = False
 
         log_path = Path(f"{date_str}_jeefhs_log.jsonl").resolve()
-        self._log_handle = open(log_path, 'a', buffering=1, encoding='utf-8')
+        # Block-buffered: entries reach the disk on the periodic _flush_log, not per line
+        self._log_handle = open(log_path, 'ab', buffering=LOG_BUFFER_SIZE)
         self._log_date = date_str
         logger.info("Logging to %s", log_path)
 
     def _current_actuator_states(self) -> Dict[str, str]:
-        status = {}
-        for item in self.device_controller.get_all_status():
-            status[item['device_name']] = item['status']
-        return status
+        # Rebuilt only when some actuator (including the buzzer timer) has changed state
+        bits = self.device_controller.state_bits
+        if bits != self._actuator_cache_bits:
+            self._actuator_state_cache = {
+                row.device_name: row.status for row in self.device_controller.get_all_status()
+            }
+            self._actuator_cache_bits = bits
+        return self._actuator_state_cache
 
     def _write_log_entry(
         self,
@@ -232,31 +333,30 @@ class JeefHSApp:
         event_type: Optional[str] = None,
         env_data: Optional[dict] = None,
         security_data: Optional[dict] = None,
+        timestamp: Optional[str] = None,
     ) -> None:
         env = env_data or self.last_env_data or {}
         sec = security_data or self.last_security_data or {}
 
-        timestamp = env.get('timestamp') or sec.get('timestamp') or datetime.now().isoformat()
+        timestamp = timestamp or env.get('timestamp') or sec.get('timestamp') or now_iso()
         with self._log_lock:
             self._ensure_log_file(timestamp)
 
             mode_value = sec.get('mode') or self.mode_manager.get_mode()
-            entry = {
-                "timestamp": timestamp,
-                "temperature": env.get('temperature'),
-                "humidity": env.get('humidity'),
-                "motion_detected": sec.get('motion_detected', False),
-                "image_path": sec.get('image_path'),
-                "mode": mode_value,
-                "actuators": self._current_actuator_states(),
-                "buzzer_triggered": sec.get('buzzer_triggered', False),
-            }
-            if env.get('source'):
-                entry['environment_source'] = env.get('source')
-            if event_type:
-                entry['event'] = event_type
-
-            self._log_handle.write(json.dumps(entry) + '\n')
+            entry = LogEntry(
+                timestamp=timestamp,
+                temperature=env.get('temperature'),
+                humidity=env.get('humidity'),
+                motion_detected=sec.get('motion_detected', False),
+                image_path=sec.get('image_path'),
+                mode=mode_value,
+                actuators=self._current_actuator_states(),
+                buzzer_triggered=sec.get('buzzer_triggered', False),
+                environment_source=env.get('source') or None,
+                event=event_type or None,
+            )
+
+            self._log_handle.write(_encode_log_line(entry))
             self._needs_flush = True
 
     def _flush_log(self) -> None:
@@ -264,9 +364,18 @@ class JeefHSApp:
             if self._log_handle is None:
                 return
             self._log_handle.flush()
-            os.fsync(self._log_handle.fileno())
+            _fdatasync(self._log_handle.fileno())
             self._needs_flush = False
 
+    def _durability_flush(self) -> None:
+        try:
+            if self._needs_flush:
+                self._flush_log()
+            # Buffered DB rows go to SQLite in one transaction per flush tick
+            self.db.flush()
+        except Exception as exc:
+            logger.error("Periodic flush failed: %s", exc, exc_info=True)
+
     # ------------------------------------------------------------------
     # Mode and MQTT callbacks
     # ------------------------------------------------------------------
@@ -277,6 +386,13 @@ class JeefHSApp:
         self.last_security_data['mode'] = new_mode
         self._write_log_entry(event_type='mode_change')
 
+    def _publish_device_states(self, changes: Dict[str, str]) -> None:
+        # Called once per burst of toggles with the final state of each changed device
+        for device_name, state in changes.items():
+            status_feed = self.status_feeds.get(device_name)
+            if status_feed:
+                self.mqtt_agent.send_to_adafruit_io(status_feed, state)
+
     def _handle_remote_device_state(self, device_name: str, new_state: bool) -> None:
         if device_name == 'party_mode':
             if new_state:
@@ -304,32 +420,20 @@ class JeefHSApp:
     # Party mode implementation
     # ------------------------------------------------------------------
     def _party_worker(self, stop_event: threading.Event) -> None:
-        seq = [
-            (('red_led',), 0.3),
-            (('green_led',), 0.3),
-            (('blue_led',), 0.3),
-            (('red_led','green_led'), 0.25),
-            (('green_led','blue_led'), 0.25),
-            (('red_led','blue_led'), 0.25),
-            (('red_led','green_led','blue_led'), 0.5),
-            ((), 0.2),
-        ]
         try:
-            while not stop_event.is_set():
-                for leds, delay in seq:
-                    if stop_event.is_set():
-                        break
-                    for name in ('red_led', 'green_led', 'blue_led'):
-                        self.device_controller.set_device_state(name, name in leds)
-                    time.sleep(delay)
+            while True:
+                for states, delay in PARTY_SEQUENCE:
+                    self.device_controller.set_device_states(states)
+                    # Returns as soon as party mode is stopped instead of sleeping out the step
+                    if stop_event.wait(delay):
+                        return
         except Exception as exc:
             logger.exception("Party worker failed: %s", exc)
         finally:
-            for name in ('red_led', 'green_led', 'blue_led'):
-                try:
-                    self.device_controller.set_device_state(name, False)
-                except Exception:
-                    pass
+            try:
+                self.device_controller.set_device_states(PARTY_ALL_OFF)
+            except Exception:
+                pass
 
     def _start_party_mode(self) -> None:
         with self._party_lock:
@@ -363,34 +467,38 @@ class JeefHSApp:
     # ------------------------------------------------------------------
     # Loop workers
     # ------------------------------------------------------------------
-    def _maybe_send_heartbeat(self, current_time: float) -> None:
+    def _maybe_send_heartbeat(self, current_time: float, timestamp_iso: Optional[str] = None) -> None:
         if not self.heartbeat_feed:
             return
         if current_time - self._last_heartbeat_time < self.heartbeat_interval:
             return
-        payload = datetime.now().isoformat()
+        payload = timestamp_iso or now_iso()
         if self.mqtt_agent.send_to_adafruit_io(self.heartbeat_feed, payload):
             logger.debug("Heartbeat published")
         self._last_heartbeat_time = current_time
 
     def data_collection_loop(self) -> None:
         timers = {
-            'env_check': 0.0,
-            'security_check': 0.0,
-            'security_send': 0.0,
+            'env_check': float('-inf'),
+            'security_check': float('-inf'),
+            'security_send': float('-inf'),
         }
         security_counts = {'motion': 0}
 
         try:
             while self.running:
                 try:
-                    current_time = time.time()
-                    self.collect_security_data(current_time, timers, security_counts)
-                    self.collect_environmental_data(current_time, timers)
-                    self._maybe_send_heartbeat(current_time)
-
-                    if self._needs_flush and current_time - self._last_flush_time >= self.flush_interval:
-                        self._flush_log()
+                    current_time = time.monotonic()
+                    # One formatted timestamp per tick, shared by every record produced in it
+                    timestamp_iso = now_iso()
+                    self.collect_security_data(current_time, timers, security_counts, timestamp_iso)
+                    self.collect_environmental_data(current_time, timers, timestamp_iso)
+                    self._maybe_send_heartbeat(current_time, timestamp_iso)
+
+                    if current_time - self._last_flush_time >= self.flush_interval:
+                        # Skip this tick if the previous flush is still waiting on the SD card
+                        if self._flush_future is None or self._flush_future.done():
+                            self._flush_future = self._io_executor.submit(self._durability_flush)
                         self._last_flush_time = current_time
 
                     time.sleep(1)
@@ -398,10 +506,11 @@ class JeefHSApp:
                     logger.error("Error in data collection loop: %s", exc, exc_info=True)
                     time.sleep(5)
         finally:
+            self._io_executor.shutdown(wait=True)
             with self._log_lock:
                 if self._log_handle is not None:
                     self._log_handle.flush()
-                    os.fsync(self._log_handle.fileno())
+                    _fdatasync(self._log_handle.fileno())
                     self._log_handle.close()
                     self._log_handle = None
                     self._needs_flush = False
@@ -429,6 +538,10 @@ class JeefHSApp:
             logger.info("Stopping database sync...")
             self.db.close()
             
+            try:
+                self.env_data.close()
+            except Exception:
+                pass
             try:
                 self.security_data.close()
             except Exception:
@@ -0,0 +1,96 @@
+"""GPIO pin resolution shared by the actuator and sensor modules."""
+
+from __future__ import annotations
+
+import functools
+import re
+
+# Blinka's board/pinmap modules are slow to import and pull in the whole
+# hardware stack, so they are only loaded the first time a pin is resolved.
+_UNLOADED = object()
+_board = _UNLOADED
+_pinmap = _UNLOADED
+
+
+def _get_board():
+    """Return the Blinka ``board`` module, or None when running off Pi."""
+    global _board
+    if _board is _UNLOADED:
+        try:
+            import board as _board_mod
+        except ImportError:  # pragma: no cover - running off Pi
+            _board_mod = None
+        _board = _board_mod
+    return _board
+
+
+def _get_pinmap():
+    """Return the BCM pin map for this Pi, or None when running off Pi."""
+    global _pinmap
+    if _pinmap is _UNLOADED:
+        try:
+            # Pi 5 / newer (BCM2712)
+            from adafruit_blinka.microcontroller.bcm2712 import pin as _pinmap_mod
+        except ImportError:
+            try:
+                # Pi 4 / older (BCM283x)
+                from adafruit_blinka.microcontroller.bcm283x import pin as _pinmap_mod
+            except ImportError:  # pragma: no cover - running off Pi
+                _pinmap_mod = None
+        _pinmap = _pinmap_mod
+    return _pinmap
+
+
+# "BCM:13", "D13", "GP13", "GPIO13" or a bare "13" (case-insensitive)
+_PIN_RE = re.compile(r"^(?:BCM:|D|GP|GPIO)?(\d+)$", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=64)
+def _gpio_obj_from_int(n: int):
+    # turn 13 -> "GPIO13", look that up on _pinmap
+    attr = f"GPIO{n}"
+    pinmap = _get_pinmap()
+    if pinmap is not None and hasattr(pinmap, attr):
+        return getattr(pinmap, attr)
+
+    # Fallback: some Blinka/board mappings expose D<nn> or GP<nn> on the
+    # `board` module instead of GPIO<nn> on the microcontroller pinmap.
+    # Try a few common attribute names on `board` before failing so the
+    # code is more portable across Pi models and Blinka versions.
+    board = _get_board()
+    if board is not None:
+        for cand in (f"D{n}", f"GP{n}", attr):
+            if hasattr(board, cand):
+                return getattr(board, cand)
+
+    raise RuntimeError(f"No {attr} in this Pi's pin map")
+
+
+def resolve_pin(pin_spec):
+    """Return a pin object suitable for digitalio.DigitalInOut based on config.
+    Accepts:
+      - "D13", "D21", etc.
+      - "GPIO13", "GP13", "BCM:13" or "13"
+      - int 13
+      - any other attribute name exposed by `board` (e.g. "SCL")
+    We'll ultimately map to _pinmap.GPIO13 etc.
+    """
+    if pin_spec is None:
+        raise RuntimeError("GPIO pin specification missing in config")
+
+    # int form (ex: 13)
+    if isinstance(pin_spec, int):
+        return _gpio_obj_from_int(pin_spec)
+
+    # string form
+    if isinstance(pin_spec, str):
+        spec = pin_spec.strip()
+        m = _PIN_RE.match(spec)
+        if m:
+            return _gpio_obj_from_int(int(m.group(1)))
+        board = _get_board()
+        if board is not None and hasattr(board, spec):
+            return getattr(board, spec)
+        raise RuntimeError(f"Unsupported pin string '{spec}'")
+
+    raise TypeError(f"Unsupported pin specification type: {type(pin_spec)}")
@@ -0,0 +1,22 @@
+"""Shared wall-clock ISO timestamps for telemetry and status reports."""
+
+from __future__ import annotations
+
+import time
+from datetime import datetime
+
+# Readings taken in the same loop tick share one formatted timestamp
+_CACHE_WINDOW_S = 0.1
+_last = (0.0, "")  # (epoch seconds, ISO string)
+
+
+def now_iso() -> str:
+    """Return datetime.now().isoformat(), reformatted at most once per 100 ms."""
+    global _last
+    t = time.time()
+    cached_t, cached_iso = _last
+    if 0.0 <= t - cached_t < _CACHE_WINDOW_S:
+        return cached_iso
+    iso = datetime.fromtimestamp(t).isoformat()
+    _last = (t, iso)
+    return iso
@@ -4,7 +4,7 @@ from __future__ import annotations
 
 import logging
 import threading
-from typing import Callable, List
+from typing import Callable, Dict
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +17,8 @@ class ModeManager:
     def __init__(self, initial_mode: str = "HOME") -> None:
         self._lock = threading.RLock()
         self._mode = self._normalise(initial_mode)
-        self._callbacks: List[Callable[[str], None]] = []
+        # dict as an ordered set: O(1) duplicate check, callbacks run in registration order
+        self._callbacks: Dict[Callable[[str], None], None] = {}
 
     # ------------------------------------------------------------------
     # Public API
@@ -44,8 +45,8 @@ class ModeManager:
         return True
 
     def register_callback(self, callback: Callable[[str], None]) -> None:
-        if callback not in self._callbacks:
-            self._callbacks.append(callback)
+        with self._lock:
+            self._callbacks.setdefault(callback, None)
 
     # ------------------------------------------------------------------
     # Helpers
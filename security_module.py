@@ -3,20 +3,25 @@
 
 import json
 import time
-from datetime import datetime
 from pathlib import Path
 import logging
+import mmap
 import os
+import queue
 import ssl
 import smtplib
+import string
+import threading
+from collections import Counter
 from typing import Callable, Optional
 
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
+from email.message import EmailMessage
 
 from dotenv import load_dotenv  # NEW: For loading secrets
 
+from config_loader import read_config_file
+from jeefhs_time import now_iso
+
 try:
     import board
     import digitalio
@@ -24,17 +29,50 @@ except ImportError:
     board = None
     digitalio = None
 
+# Pin name -> board pin object, built once (skips board's helpers like I2C()/SPI())
+_BOARD_PIN_CACHE = {}
+if board is not None:
+    for _name in dir(board):
+        _obj = getattr(board, _name)
+        if _name[:1].isupper() and not callable(_obj):
+            _BOARD_PIN_CACHE[_name] = _obj
+    del _name, _obj
+
+try:
+    import gpiod
+    from gpiod.line import Bias, Direction, Edge, Value
+except ImportError:  # libgpiod v2 bindings not installed
+    gpiod = None
+
+try:
+    import RPi.GPIO as GPIO
+except (ImportError, RuntimeError):  # RPi.GPIO raises RuntimeError off a Pi
+    GPIO = None
+
 try:
     from picamera2 import Picamera2
-    import cv2
 except ImportError:
     Picamera2 = None
-    cv2 = None
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+# Alert body; only the per-alert fields are substituted at send time
+ALERT_BODY_TEMPLATE = string.Template(
+    "JeefHS Security Alert\n\n"
+    "Type: $alert_type\n"
+    "Time: $time\n"
+    "$message\n"
+    "$suppressed"
+)
+
+# Cached SMTP sessions idle longer than this are closed and reopened before use
+SMTP_IDLE_RECYCLE_S = 60
+
+# Alert emails only need a preview of the capture
+EMAIL_THUMB_SIZE = (640, 480)
+
 
 def resolve_pin(pin_spec):
     if pin_spec is None:
@@ -44,11 +82,11 @@ def resolve_pin(pin_spec):
     if isinstance(pin_spec, str):
         if pin_spec.upper().startswith("BCM:"):
             return int(pin_spec.split(":", 1)[1])
-        try:
-            if board:
-                return getattr(board, pin_spec)
-        except AttributeError:
-            raise RuntimeError(f"Unknown board pin '{pin_spec}'")
+        if board:
+            pin = _BOARD_PIN_CACHE.get(pin_spec)
+            if pin is None:
+                raise RuntimeError(f"Unknown board pin '{pin_spec}'")
+            return pin
     raise TypeError(f"Unsupported pin spec type: {type(pin_spec)}")
 
 
@@ -70,35 +108,88 @@ class security_module:
         self.config = self._load_config(config_file)
         self._validate_pins(self.config.get("PINS", {}))
 
+        # Settings read on the motion/alert path, coerced once here rather than per event
+        self._camera_enabled = bool(self.config.get("camera_enabled"))
+        self._cooldown_s = int(self.config.get("alert_cooldown_s", 300))
+        self._smtp_host = self.config.get("SMTP_HOST")
+        self._smtp_port = self.config["SMTP_PORT"]
+        self._smtp_ssl = self.config["SMTP_SSL"]  # implicit TLS (465) instead of STARTTLS (587)
+        self._ssl_ctx = ssl.create_default_context()  # parsing the CA bundle is slow; reuse it
+        self._smtp_user = self.config.get("SMTP_USER")
+        self._smtp_pass = self.config.get("SMTP_PASS")
+        self._alert_from = self.config.get("ALERT_FROM")
+        self._alert_to = self.config.get("ALERT_TO")
+        self._alert_subject_prefix = "🚨 JeefHS Alert: "
+
+        # Modes (upper-case, as get_security_data normalises them) in which motion sounds the buzzer
+        self._buzzer_modes = frozenset(m.upper() for m in self.config.get("buzzer_modes", ["AWAY"]))
         self._mode_getter = mode_getter or (lambda: "HOME")
+        # "edge": capture/alert once per LOW->HIGH transition; "level": on every poll that sees motion
+        self._motion_mode = str(self.config.get("motion_mode", "edge")).lower()
+        self._prev_motion = False
+        # Set when wait_for_motion consumes an edge, so the next get_security_data still reports it
+        self._edge_latched = False
         self._buzzer_callback = buzzer_callback
 
-        # Resolve PIR pin
-        if board and digitalio:
-            pir_pin = resolve_pin(self.config["PINS"]["pir"])
-            self.pir = digitalio.DigitalInOut(pir_pin)
-            self.pir.direction = digitalio.Direction.INPUT
-        else:
-            logger.warning("GPIO not available; Security module in simulation mode.")
-            self.pir = None
+        # Resolve PIR pin. Prefer kernel edge events (latched between polls) over reading the level:
+        # gpiod line request first, then RPi.GPIO's interrupt callback, then digitalio polling.
+        self.pir = None
+        self._pir_request = None
+        self._pir_bcm = None
+        self._motion_event = None
+        if gpiod is not None:
+            try:
+                self._setup_pir_line_request(resolve_pin(self.config["PINS"]["pir"]))
+            except Exception as e:
+                logger.warning("gpiod PIR edge events unavailable (%s); trying RPi.GPIO.", e)
+                self._pir_request = None
+
+        if self._pir_request is None and GPIO is not None:
+            try:
+                self._setup_pir_edge_detect(resolve_pin(self.config["PINS"]["pir"]))
+            except Exception as e:
+                logger.warning("PIR edge detection unavailable (%s); polling instead.", e)
+                self._pir_bcm = None
+                self._motion_event = None
+
+        if self._pir_request is None and self._motion_event is None:
+            if board and digitalio:
+                pir_pin = resolve_pin(self.config["PINS"]["pir"])
+                self.pir = digitalio.DigitalInOut(pir_pin)
+                self.pir.direction = digitalio.Direction.INPUT
+            else:
+                logger.warning("GPIO not available; Security module in simulation mode.")
 
         # Camera
         self.image_dir = self.config.get("image_dir", "captured_images")
-        os.makedirs(self.image_dir, exist_ok=True)
+        self._image_dir = Path(self.image_dir)
+        self._image_dir.mkdir(parents=True, exist_ok=True)
 
         self.picam2 = None
-        if self.config.get("camera_enabled") and Picamera2:
+        if self._camera_enabled and Picamera2:
             try:
                 self.picam2 = Picamera2()
-                cfg = self.picam2.create_still_configuration()
+                # Fixed still size with two buffers keeps capture memory bounded on the Pi
+                width, height = self.config.get("camera_resolution", (1920, 1080))
+                cfg = self.picam2.create_still_configuration(
+                    main={"size": (int(width), int(height))}, buffer_count=2
+                )
                 self.picam2.configure(cfg)
                 self.picam2.start()
                 logger.info("Picamera2 initialized.")
             except Exception as e:
                 logger.warning(f"Picamera2 init failed: {e}")
 
-        # Per-alert-type cooldown tracker
+        # Per-alert-type cooldown tracker, plus how many alerts each cooldown swallowed
         self._last_alert_time = {}
+        self._suppressed_count = Counter()
+
+        # SMTP runs on its own thread so a slow mail server never stalls PIR polling
+        self._email_queue = queue.Queue(maxsize=32)
+        self._smtp: smtplib.SMTP | None = None  # owned by the email worker
+        self._smtp_last_use = 0.0
+        self._email_thread = threading.Thread(target=self._email_worker, name="EmailAlerts", daemon=True)
+        self._email_thread.start()
 
     # -------------------- config helpers --------------------
 
@@ -108,8 +199,8 @@ class security_module:
         load_dotenv()
         
         try:
-            with open(path, "r") as f:
-                cfg = json.load(f)
+            # read_config_file hands back a private copy, so SMTP settings can be injected below
+            cfg = read_config_file(path)
         except FileNotFoundError:
             raise RuntimeError(f"Missing {path}")
         except json.JSONDecodeError as e:
@@ -117,7 +208,9 @@ class security_module:
 
         # Inject SMTP Secrets from ENV (Safe fallback to config.json if not in env)
         cfg["SMTP_HOST"] = os.getenv("SMTP_HOST", cfg.get("SMTP_HOST"))
-        cfg["SMTP_PORT"] = int(os.getenv("SMTP_PORT", cfg.get("SMTP_PORT", 587)))
+        smtp_ssl = os.getenv("SMTP_SSL")
+        cfg["SMTP_SSL"] = smtp_ssl.lower() in ("1", "true", "yes") if smtp_ssl else bool(cfg.get("SMTP_SSL", False))
+        cfg["SMTP_PORT"] = int(os.getenv("SMTP_PORT", cfg.get("SMTP_PORT", 465 if cfg["SMTP_SSL"] else 587)))
         cfg["SMTP_USER"] = os.getenv("SMTP_USER", cfg.get("SMTP_USER"))
         cfg["SMTP_PASS"] = os.getenv("SMTP_PASS", cfg.get("SMTP_PASS"))
         cfg["ALERT_FROM"] = os.getenv("ALERT_FROM", cfg.get("ALERT_FROM"))
@@ -129,15 +222,84 @@ class security_module:
 
         return cfg
 
+    def _setup_pir_line_request(self, pir_pin):
+        bcm = int(getattr(pir_pin, "id", pir_pin))  # Blinka pins carry their BCM number as .id
+        chip = self.config.get("gpio_chip", "/dev/gpiochip0")
+        self._pir_request = gpiod.request_lines(
+            chip,
+            consumer="jeefhs-pir",
+            config={
+                bcm: gpiod.LineSettings(
+                    direction=Direction.INPUT, edge_detection=Edge.RISING, bias=Bias.PULL_DOWN
+                )
+            },
+        )
+        self._pir_bcm = bcm
+        logger.info("PIR gpiod edge events enabled on %s line %d", chip, bcm)
+
+    def _drain_pir_events(self, timeout_s: float = 0.0) -> bool:
+        """Block up to timeout_s for a PIR rising edge; consumes every queued event."""
+        if not self._pir_request.wait_edge_events(timeout_s):
+            return False
+        # Each call returns what the kernel has buffered; loop until nothing is left pending
+        while self._pir_request.read_edge_events() and self._pir_request.wait_edge_events(0):
+            pass
+        return True
+
+    def _setup_pir_edge_detect(self, pir_pin):
+        bcm = int(getattr(pir_pin, "id", pir_pin))  # Blinka pins carry their BCM number as .id
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(bcm, GPIO.IN)
+        self._motion_event = threading.Event()
+        GPIO.add_event_detect(bcm, GPIO.RISING, callback=self._on_pir_edge, bouncetime=200)
+        self._pir_bcm = bcm
+        logger.info("PIR edge detection enabled on BCM %d", bcm)
+
+    def _on_pir_edge(self, channel):
+        self._motion_event.set()
+
     def _validate_pins(self, pins_cfg):
         if "pir" not in pins_cfg:
             raise RuntimeError("PINS.pir must be set in config.json")
 
     # -------------------- main API --------------------
 
-    def get_security_data(self) -> dict:
-        # Read Hardware or Simulate
-        if self.pir:
+    def wait_for_motion(self, timeout_s: float) -> bool:
+        """Block until the PIR fires or timeout_s elapses; returns True on motion.
+
+        Edge-driven backends sleep in the kernel until the line toggles; the
+        polling fallback checks the level once and sleeps out the timeout.
+        A consumed edge stays latched for the next get_security_data() poll.
+        """
+        if self._pir_request is not None:
+            fired = self._drain_pir_events(timeout_s)
+            self._edge_latched = self._edge_latched or fired
+            return fired
+        if self._motion_event is not None:
+            fired = self._motion_event.wait(timeout_s)
+            self._motion_event.clear()
+            self._edge_latched = self._edge_latched or fired
+            return fired
+        if self.pir and self.pir.value:
+            return True
+        time.sleep(timeout_s)
+        return False
+
+    def get_security_data(self, timestamp: Optional[str] = None) -> dict:
+        # Read Hardware or Simulate. edge_seen stays None for backends that only report the level.
+        edge_seen = None
+        if self._pir_request is not None:
+            # Edges queued since the last check count; fall back to the level if none arrived
+            edge_seen = self._drain_pir_events() or self._edge_latched
+            self._edge_latched = False
+            motion_detected = edge_seen or self._pir_request.get_value(self._pir_bcm) == Value.ACTIVE
+        elif self._motion_event is not None:
+            # Any rising edge since the last check counts, even if the PIR has already dropped
+            edge_seen = self._motion_event.is_set() or self._edge_latched
+            self._motion_event.clear()
+            self._edge_latched = False
+            motion_detected = edge_seen
+        elif self.pir:
             motion_detected = bool(self.pir.value)
         else:
             motion_detected = False # Or simulate random motion for testing
@@ -146,13 +308,23 @@ class security_module:
         buzzer_triggered = False
         image_path = None
 
-        if motion_detected:
+        if self._motion_mode != "edge":
+            triggered = motion_detected
+        elif edge_seen is not None:
+            # Interrupt backends already report each rising edge, back-to-back ones included
+            triggered = edge_seen
+        else:
+            # Level polling: detect the LOW->HIGH transition in software
+            triggered = motion_detected and not self._prev_motion
+        self._prev_motion = motion_detected
+
+        if triggered:
             # Capture Image
-            if self.config.get("camera_enabled"):
+            if self._camera_enabled:
                 image_path = self._capture_image()
             
             # Pulse Buzzer if AWAY
-            if self._mode_allows_buzzer(mode):
+            if mode in self._buzzer_modes:
                 buzzer_triggered = self._pulse_buzzer()
 
             # Send Email
@@ -163,18 +335,15 @@ class security_module:
             )
 
         return {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp or now_iso(),
             "motion_detected": motion_detected,
-            "image_path": image_path,
+            "image_path": str(image_path) if image_path is not None else None,
             "mode": mode,
             "buzzer_triggered": buzzer_triggered
         }
 
     # -------------------- internals --------------------
 
-    def _mode_allows_buzzer(self, mode: str) -> bool:
-        return mode.upper() == "AWAY"
-
     def _pulse_buzzer(self) -> bool:
         if self._buzzer_callback is None:
             return False
@@ -185,83 +354,210 @@ class security_module:
             logger.warning("Failed to pulse buzzer: %s", exc)
             return False
 
-    def _capture_image(self) -> str:
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
+    def _capture_image(self) -> Path | None:
+        # time.strftime formats the struct_time directly, without building a datetime
+        ts = time.strftime("%Y%m%d_%H%M%S")
+
         # If camera not initialized, just write a text placeholder
-        if not self.picam2 or not cv2:
-            out_txt = os.path.join(self.image_dir, f"motion_{ts}_placeholder.txt")
-            with open(out_txt, "w") as f:
-                f.write(f"Motion detected at {datetime.now().isoformat()} (Camera Unavailable)")
+        if not self.picam2:
+            out_txt = self._image_dir / f"motion_{ts}_placeholder.txt"
+            out_txt.write_text(f"Motion detected at {now_iso()} (Camera Unavailable)")
             return out_txt
 
-        out_jpg = os.path.join(self.image_dir, f"motion_{ts}.jpg")
+        out_jpg = self._image_dir / f"motion_{ts}.jpg"
         try:
-            frame = self.picam2.capture_array()
-            cv2.imwrite(out_jpg, frame)
+            # Picamera2 encodes .jpg targets itself, without an RGB array copy + OpenCV re-encode
+            self.picam2.capture_file(str(out_jpg))
             logger.info(f"Image captured: {out_jpg}")
             return out_jpg
         except Exception as e:
             logger.warning(f"Camera capture failed ({e})")
+
+        try:
+            # OpenCV is only needed here, so its shared libraries are loaded on first failure
+            import cv2
+        except ImportError:
+            return None
+        try:
+            # Fallback: grab the raw frame and encode it in software
+            cv2.imwrite(str(out_jpg), self.picam2.capture_array())
+            logger.info("Image captured via OpenCV fallback: %s", out_jpg)
+            return out_jpg
+        except Exception as e:
+            logger.warning("OpenCV capture fallback failed (%s)", e)
             return None
 
-    def _send_email_alert(self, alert_type: str, message: str = "", image_path: str | None = None) -> bool:
-        """Send via SMTP with cooldown."""
-        cooldown = int(self.config.get("alert_cooldown_s", 300))
-        now = time.time()
-        last = self._last_alert_time.get(alert_type, 0.0)
-        
-        if now - last < cooldown:
+    def _send_email_alert(self, alert_type: str, message: str = "", image_path: Path | None = None) -> bool:
+        """Queue an alert for the email worker; returns False if it is suppressed or dropped."""
+        if not self._smtp_host or not self._smtp_user:
             return False
 
-        if not self.config.get("SMTP_HOST") or not self.config.get("SMTP_USER"):
+        # Cooldown is decided here so suppressed alerts never reach the queue
+        now = time.monotonic()
+        last = self._last_alert_time.get(alert_type)
+        if last is not None and now - last < self._cooldown_s:
+            # Reported in the next email that goes out, like syslog's "last message repeated"
+            self._suppressed_count[alert_type] += 1
             return False
 
+        suppressed = self._suppressed_count.pop(alert_type, 0)
         try:
-            msg = MIMEMultipart()
-            msg["From"] = self.config["ALERT_FROM"]
-            msg["To"] = self.config["ALERT_TO"]
-            msg["Subject"] = f"🚨 JeefHS Alert: {alert_type}"
-
-            body = (
-                f"JeefHS Security Alert\n\n"
-                f"Type: {alert_type}\n"
-                f"Time: {datetime.now():%Y-%m-%d %H:%M:%S}\n"
-                f"{message}\n"
-            )
-            msg.attach(MIMEText(body, "plain"))
-
-            if image_path and Path(image_path).exists() and image_path.endswith(".jpg"):
+            # Detection time travels with the alert, so a backed-up outbox doesn't skew "Time:"
+            self._email_queue.put_nowait((alert_type, message, image_path, time.time(), last, suppressed))
+        except queue.Full:
+            logger.warning("Email outbox full; dropping %s alert", alert_type)
+            self._suppressed_count[alert_type] += suppressed + 1
+            return False
+        self._last_alert_time[alert_type] = now
+        return True
+
+    def _email_worker(self):
+        while True:
+            item = self._email_queue.get()
+            if item is None:
+                break
+            alert_type, message, image_path, detected_at, previous, suppressed = item
+            try:
+                sent = self._deliver_email_alert(alert_type, message, image_path, suppressed, detected_at)
+            except Exception as e:
+                logger.error("Email worker error: %s", e)
+                sent = False
+            if not sent:
+                # Undo the cooldown reservation so the next motion event can retry,
+                # and carry the suppressed count over to that retry
+                self._last_alert_time[alert_type] = previous
+                self._suppressed_count[alert_type] += suppressed
+        # The worker owns the SMTP session, so it is the one to close it
+        self._close_smtp()
+
+    def _deliver_email_alert(
+        self,
+        alert_type: str,
+        message: str = "",
+        image_path: Path | None = None,
+        suppressed: int = 0,
+        detected_at: float | None = None,
+    ) -> bool:
+        """Send one alert via SMTP; cooldown has already been applied by _send_email_alert."""
+        try:
+            msg = EmailMessage()
+            msg["From"] = self._alert_from
+            msg["To"] = self._alert_to
+            msg["Subject"] = f"{self._alert_subject_prefix}{alert_type}"
+            msg.set_content(ALERT_BODY_TEMPLATE.substitute(
+                alert_type=alert_type,
+                time=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(detected_at)),
+                message=message,
+                suppressed=f"(+{suppressed} additional triggers during cooldown)\n" if suppressed else "",
+            ))
+
+            if image_path is not None and image_path.suffix == ".jpg" and image_path.is_file():
                 try:
-                    with open(image_path, "rb") as f:
-                        part = MIMEImage(f.read())
-                    part.add_header("Content-Disposition", "attachment", filename=Path(image_path).name)
-                    msg.attach(part)
+                    image_path = self._email_thumbnail(image_path)
+                    # Base64-encode straight from the mapped file rather than a full bytes copy
+                    with open(image_path, "rb") as f, \
+                            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                            memoryview(mm) as view:
+                        msg.add_attachment(
+                            view, maintype="image", subtype="jpeg", filename=image_path.name
+                        )
                 except Exception as e:
                     logger.warning(f"Failed attaching image: {e}")
 
-            context = ssl.create_default_context()
-            with smtplib.SMTP(self.config["SMTP_HOST"], self.config["SMTP_PORT"]) as server:
-                server.starttls(context=context)
-                server.login(self.config["SMTP_USER"], self.config["SMTP_PASS"])
-                server.send_message(msg)
+            try:
+                self._get_smtp().send_message(msg)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as e:
+                # The cached session may have been dropped server-side; retry once on a fresh one
+                logger.info("SMTP session failed (%s); reconnecting once.", e)
+                self._close_smtp()
+                self._get_smtp().send_message(msg)
+            self._smtp_last_use = time.monotonic()
 
-            self._last_alert_time[alert_type] = now
             logger.info(f"Email alert sent: {alert_type}")
             return True
 
         except Exception as e:
             logger.error(f"SMTP send failed: {e}")
+            # Don't reuse a session that just failed; the next alert reconnects
+            self._close_smtp()
             return False
 
+    def _email_thumbnail(self, image_path: Path) -> Path:
+        """Return a downscaled copy of image_path for attaching, or the original if Pillow is missing."""
+        try:
+            from PIL import Image
+        except ImportError:
+            return image_path
+
+        thumb_path = image_path.with_name(f"{image_path.stem}_thumb.jpg")
+        try:
+            with Image.open(image_path) as img:
+                # draft() lets the JPEG decoder scale down while decoding instead of after
+                img.draft("RGB", EMAIL_THUMB_SIZE)
+                img.thumbnail(EMAIL_THUMB_SIZE)
+                img.save(thumb_path, "JPEG", quality=85)
+            return thumb_path
+        except OSError as e:
+            logger.warning("Thumbnail failed (%s); attaching full image.", e)
+            return image_path
+
+    def _get_smtp(self) -> smtplib.SMTP:
+        """Return the cached SMTP session, reconnecting if the server dropped it."""
+        if self._smtp is not None and time.monotonic() - self._smtp_last_use > SMTP_IDLE_RECYCLE_S:
+            # Most servers time out idle sessions anyway; recycle before it goes stale
+            self._close_smtp()
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close_smtp()
+
+        if self._smtp_ssl:
+            # TLS from the first byte: skips the EHLO/STARTTLS/EHLO round trips
+            server = smtplib.SMTP_SSL(self._smtp_host, self._smtp_port, context=self._ssl_ctx, timeout=30)
+        else:
+            server = smtplib.SMTP(self._smtp_host, self._smtp_port, timeout=30)
+        try:
+            if not self._smtp_ssl:
+                server.starttls(context=self._ssl_ctx)
+            server.login(self._smtp_user, self._smtp_pass)
+        except Exception:
+            server.close()
+            raise
+        self._smtp = server
+        self._smtp_last_use = time.monotonic()
+        return server
+
+    def _close_smtp(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
     def close(self):
-        if self.picam2:
+        self._email_queue.put(None)
+        self._email_thread.join(timeout=10)
+        if self._email_thread.is_alive():
+            # Still mid-send; it closes its own SMTP session once it reaches the sentinel
+            logger.warning("Email worker still sending at shutdown; leaving its SMTP session to it.")
+        if self._pir_request is not None:
             try:
-                self.picam2.stop()
+                self._pir_request.release()
             except Exception:
                 pass
-        if cv2:
+            self._pir_request = None
+        elif self._pir_bcm is not None:
             try:
-                cv2.destroyAllWindows()
+                GPIO.remove_event_detect(self._pir_bcm)
+                GPIO.cleanup(self._pir_bcm)
+            except Exception:
+                pass
+        if self.picam2:
+            try:
+                self.picam2.stop()
             except Exception:
                 pass
\ No newline at end of file
@@ -1,10 +1,27 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
 import requests
-from flask import Flask, render_template, request, flash, redirect, url_for
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import Flask, Response, render_template, request, flash, redirect, stream_with_context, url_for
 from sqlalchemy import create_engine, text
-from datetime import datetime
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+try:
+    import orjson as _json  # parses straight from bytes
+
+    def _json_line(obj):
+        return _json.dumps(obj, default=float, option=_json.OPT_APPEND_NEWLINE)
+except ImportError:
+    import json as _json
+
+    def _json_line(obj):
+        return (_json.dumps(obj, default=float, separators=(",", ":")) + "\n").encode()
+
 # Load environment variables (local development)
 load_dotenv()
 
@@ -24,41 +41,113 @@ if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
 engine = None
 if DATABASE_URL:
     try:
-        engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+        # Recycle connections instead of pinging before every checkout: saves a round
+        # trip to Neon per request, and Neon closes idle connections after ~5 minutes anyway
+        engine = create_engine(
+            DATABASE_URL,
+            pool_size=10,
+            max_overflow=20,
+            pool_recycle=300,
+            pool_reset_on_return="rollback",
+            query_cache_size=1200,
+            future=True,
+        )
     except Exception as e:
         print(f"DB Config Error: {e}")
 
+# One pooled HTTPS session to Adafruit IO, so feed polls reuse the TLS connection.
+# Retry's default method list leaves POSTs alone, so control commands are never sent twice.
+_aio_session = requests.Session()
+if ADAFRUIT_IO_KEY:
+    _aio_session.headers.update({"X-AIO-Key": ADAFRUIT_IO_KEY})
+_aio_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 502, 503, 504]),
+))
+
+# Last value per feed, reused for a few seconds so dashboard refreshes don't re-hit Adafruit IO
+AIO_CACHE_TTL_S = 5.0
+_aio_cache = {}  # feed_key -> (expires_at, data)
+_aio_cache_lock = threading.Lock()
+
+# Overlaps the dashboard's feed fetches (the GIL is released while waiting on sockets)
+_aio_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="aio")
+
 # --- Helper Functions ---
+def _aio_cached(feed_key):
+    """Return (True, data) for a fresh cache entry, else (False, None)."""
+    with _aio_cache_lock:
+        hit = _aio_cache.get(feed_key)
+    if hit and hit[0] > time.monotonic():
+        return True, hit[1]
+    return False, None
+
 def aio_get(feed_key):
     """Fetch the last known value from an Adafruit IO feed."""
     if not ADAFRUIT_IO_USERNAME or not ADAFRUIT_IO_KEY:
         return None
-    
+
+    fresh, data = _aio_cached(feed_key)
+    if fresh:
+        return data
+
     url = f"https://io.adafruit.com/api/v2/{ADAFRUIT_IO_USERNAME}/feeds/{feed_key}/data/last"
-    headers = {"X-AIO-Key": ADAFRUIT_IO_KEY}
     try:
-        r = requests.get(url, headers=headers, timeout=5)
+        r = _aio_session.get(url, timeout=5)
         if r.status_code == 200:
-            return r.json()
+            data = _json.loads(r.content)
+            with _aio_cache_lock:
+                _aio_cache[feed_key] = (time.monotonic() + AIO_CACHE_TTL_S, data)
+            return data
     except Exception as e:
         print(f"AIO Get Error ({feed_key}): {e}")
     return None
 
+def aio_get_many(feed_keys):
+    """Fetch several feeds at once; cached feeds are answered without touching the pool."""
+    results = {}
+    futures = {}
+    for key in feed_keys:
+        fresh, data = _aio_cached(key)
+        if fresh:
+            results[key] = data
+        else:
+            futures[key] = _aio_pool.submit(aio_get, key)
+    for key, future in futures.items():
+        results[key] = future.result()
+    return [results[key] for key in feed_keys]
+
 def aio_send(feed_key, value):
     """Publish a value to an Adafruit IO feed."""
     if not ADAFRUIT_IO_USERNAME or not ADAFRUIT_IO_KEY:
         return False
 
     url = f"https://io.adafruit.com/api/v2/{ADAFRUIT_IO_USERNAME}/feeds/{feed_key}/data"
-    headers = {"X-AIO-Key": ADAFRUIT_IO_KEY, "Content-Type": "application/json"}
     payload = {"value": value}
     try:
-        r = requests.post(url, headers=headers, json=payload, timeout=5)
+        r = _aio_session.post(url, json=payload, timeout=5)
         return r.status_code in [200, 201]
     except Exception as e:
         print(f"AIO Send Error ({feed_key}): {e}")
         return False
 
+def aio_send_many(pairs, group_key="default"):
+    """Publish several feed values in one request via Adafruit IO's group data endpoint."""
+    if not ADAFRUIT_IO_USERNAME or not ADAFRUIT_IO_KEY:
+        return False
+    if not pairs:
+        return True
+
+    url = f"https://io.adafruit.com/api/v2/{ADAFRUIT_IO_USERNAME}/groups/{group_key}/data"
+    payload = {"feeds": [{"key": k, "value": v} for k, v in pairs.items()]}
+    try:
+        r = _aio_session.post(url, json=payload, timeout=5)
+        return r.status_code in [200, 201]
+    except Exception as e:
+        print(f"AIO Group Send Error ({group_key}): {e}")
+        return False
+
 # --- Routes ---
 
 @app.route('/')
@@ -70,9 +159,7 @@ def home():
 def dashboard():
     """Dashboard Page: Live status of 3 sensors."""
     # Feeds: temperature, humidity, mode_status
-    temp_data = aio_get("temperature")
-    hum_data = aio_get("humidity")
-    mode_data = aio_get("mode_status")
+    temp_data, hum_data, mode_data = aio_get_many(("temperature", "humidity", "mode_status"))
 
     context = {
         "temp": round(float(temp_data['value']), 1) if temp_data else "--",
@@ -82,32 +169,66 @@ def dashboard():
     }
     return render_template("dashboard.html", **context)
 
+# Query matches the schema in database_interface.py.
+# A half-open range (not timestamp::date) lets Postgres use a btree index:
+#   CREATE INDEX CONCURRENTLY idx_measurements_ts ON measurements(timestamp);
+ENV_DAY_QUERY = text("""
+    SELECT timestamp, temperature, humidity
+    FROM measurements
+    WHERE timestamp >= :start AND timestamp < :end
+    ORDER BY timestamp ASC
+""")
+
+def _parse_day(selected_date):
+    """Return midnight of a YYYY-MM-DD string, or None if it does not parse."""
+    try:
+        return datetime.strptime(selected_date, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
 @app.route('/environment', methods=['GET', 'POST'])
 def environment():
-    """Historical Data: Date selection + SQL Query + Chart.js."""
+    """Historical Data: Date selection + Chart.js (rows load from /environment/data)."""
     selected_date = request.form.get("date", datetime.now().strftime("%Y-%m-%d"))
-    data_points = []
-    
-    if engine:
-        try:
-            with engine.connect() as conn:
-                # Query matches the schema in database_interface.py
-                query = text("""
-                    SELECT timestamp, temperature, humidity 
-                    FROM measurements 
-                    WHERE timestamp::date = :date 
-                    ORDER BY timestamp ASC
-                """)
-                result = conn.execute(query, {"date": selected_date})
-                # Convert to list of dicts for JSON serialization
-                data_points = [
-                    {"t": row.timestamp.isoformat(), "temp": row.temperature, "hum": row.humidity}
-                    for row in result
-                ]
-        except Exception as e:
-            flash(f"Database Error: {e}", "danger")
+    if _parse_day(selected_date) is None:
+        flash(f"Invalid date: {selected_date}", "danger")
+    elif not engine:
+        flash("Database Error: DATABASE_URL is not configured", "danger")
+
+    return render_template("environment.html", selected_date=selected_date)
 
-    return render_template("environment.html", data=data_points, selected_date=selected_date)
+@app.route('/environment/data')
+def environment_data():
+    """One day's measurements as NDJSON, streamed straight from a server-side cursor."""
+    day_start = _parse_day(request.args.get("date"))
+    if day_start is None:
+        return Response("invalid date\n", status=400, mimetype="text/plain")
+    if not engine:
+        return Response("database not configured\n", status=503, mimetype="text/plain")
+
+    params = {"start": day_start, "end": day_start + timedelta(days=1)}
+
+    # Connect and run the query before the status line goes out, so failures get a real error code;
+    # only fetching the rows is deferred to the streamed body.
+    conn = None
+    try:
+        conn = engine.connect().execution_options(stream_results=True, yield_per=500)
+        result = conn.execute(ENV_DAY_QUERY, params)
+    except SQLAlchemyError as e:
+        if conn is not None:
+            conn.close()
+        print(f"Environment data query failed: {e}")
+        status = 503 if isinstance(e, OperationalError) else 500
+        return Response("database error\n", status=status, mimetype="text/plain")
+
+    def generate():
+        for row in result:
+            yield _json_line({"t": row.timestamp.isoformat(), "temp": row.temperature, "hum": row.humidity})
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    # Runs when the WSGI server closes the response, even if the client left before the first row
+    response.call_on_close(conn.close)
+    return response
 
 @app.route('/security')
 def security():
@@ -143,22 +264,36 @@ def security_control():
 def devices():
     """Device Control Page: Toggle 3 devices."""
     if request.method == 'POST':
-        device = request.form.get("device")
-        state = request.form.get("state")
-        
         # CORRECTED KEYS: Using dashes to match Adafruit IO
         feed_map = {
             "fan": "fan-control",
             "buzzer": "buzzer-control",
             "party": "party-mode-control"
         }
-        
-        if device in feed_map:
+
+        # Either a single device/state pair, or several device_<n>/state_<n> pairs
+        requested = {}
+        if request.form.get("device"):
+            requested[request.form["device"]] = request.form.get("state")
+        for field, device in request.form.items():
+            if field.startswith("device_"):
+                requested[device] = request.form.get("state_" + field[len("device_"):])
+
+        changes = {d: st for d, st in requested.items() if d in feed_map and st}
+        if len(changes) == 1:
+            device, state = next(iter(changes.items()))
             # aio_send returns True on success, False on failure
             if aio_send(feed_map[device], state):
                 flash(f"{device.title()} turned {state}", "success")
             else:
                 flash("Failed to communicate with device", "danger")
+        elif changes:
+            # One HTTPS round trip for the whole batch
+            if aio_send_many({feed_map[d]: st for d, st in changes.items()}):
+                summary = ", ".join(f"{d.title()} {st}" for d, st in changes.items())
+                flash(f"Updated: {summary}", "success")
+            else:
+                flash("Failed to communicate with device", "danger")
     
     return render_template("devices.html")
 
@@ -167,6 +302,14 @@ def about():
     """Team Page."""
     return render_template("about.html")
 
+# Compile every template at import so the first request after a cold start doesn't pay for it.
+# Production templates never change under a running worker, so skip the per-render mtime check there.
+if not app.debug:
+    app.jinja_env.auto_reload = False
+for _template in ("layout.html", "home.html", "dashboard.html", "environment.html",
+                  "security.html", "devices.html", "about.html"):
+    app.jinja_env.get_template(_template)
+
 if __name__ == '__main__':
     # Local dev run
     app.run(debug=True, port=5000)
\ No newline at end of file